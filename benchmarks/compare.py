@@ -0,0 +1,51 @@
+"""Compares two result files of run.py, e.g. of a base and a new commit.
+
+  python benchmarks/compare.py base.json new.json
+
+Prints every metric found in both files with its relative change.
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Any
+
+def _flatten(value: Any, path: str = "") -> dict[str, float]:
+  if isinstance(value, bool):
+    return {}
+  if isinstance(value, (int, float)):
+    return {path: value}
+  if isinstance(value, dict):
+    items = value.items()
+  elif isinstance(value, list):
+    items = (_list_item(i, item) for i, item in enumerate(value))
+  else:
+    return {}
+  metrics: dict[str, float] = {}
+  for key, item in items:
+    metrics |= _flatten(item, f"{path}.{key}" if path else str(key))
+  return metrics
+
+def _list_item(index: int, item: Any) -> tuple[str, Any]:
+  # Job runs are keyed by their concurrency setting
+  if isinstance(item, dict) and "max_concurrent_jobs" in item:
+    return f"concurrency={item['max_concurrent_jobs']}", item
+  return str(index), item
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("base", type=Path)
+  parser.add_argument("new", type=Path)
+  args = parser.parse_args()
+  base, new = (json.loads(path.read_text()) for path in (args.base, args.new))
+  base_metrics = _flatten({k: v for k, v in base.items() if k != "settings"})
+  new_metrics = _flatten({k: v for k, v in new.items() if k != "settings"})
+  print(f"{'metric':<60} {'base':>12} {'new':>12} {'change':>8}")
+  for name, old in base_metrics.items():
+    if name not in new_metrics:
+      continue
+    value = new_metrics[name]
+    change = f"{(value - old) / old:+.1%}" if old else ""
+    print(f"{name:<60} {old:>12g} {value:>12g} {change:>8}")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,142 @@
+"""OpenAI-compatible stub server for benchmarks.
+
+Serves `/v1/models` and `/v1/chat/completions`, streaming or not, with a
+configurable latency and a share of requests answered with 429.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+MODELS = ["bench-small", "bench-large"]
+
+class Settings:
+  latency: float = 0.2
+  token_delay: float = 0.005
+  completion_tokens: int = 64
+  rate_limit_ratio: float = 0.0
+  retry_after_ms: int = 100
+
+settings = Settings()
+app = FastAPI()
+
+@app.get("/v1/models")
+async def list_models():
+  return {
+      "object":
+      "list",
+      "data": [
+          dict(id=name, object="model", created=0, owned_by="bench")
+          for name in MODELS
+      ]
+  }
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+  body = await request.json()
+  if random.random() < settings.rate_limit_ratio:
+    return JSONResponse(
+        status_code=429,
+        headers={"retry-after-ms": str(settings.retry_after_ms)},
+        content={
+            "error": {
+                "message": "Rate limit reached",
+                "type": "requests",
+                "code": "rate_limit_exceeded"
+            }
+        })
+  await asyncio.sleep(settings.latency)
+  prompt_tokens = sum(
+      len(str(message.get("content", "")).split())
+      for message in body["messages"])
+  tokens = [f"word{i} " for i in range(settings.completion_tokens)]
+  usage = dict(
+      prompt_tokens=prompt_tokens,
+      completion_tokens=len(tokens),
+      total_tokens=prompt_tokens + len(tokens))
+  if body.get("stream"):
+    include_usage = (body.get("stream_options") or {}).get("include_usage")
+    return StreamingResponse(
+        _stream(body["model"], tokens, usage if include_usage else None),
+        media_type="text/event-stream")
+  return {
+      "id":
+      "chatcmpl-bench",
+      "object":
+      "chat.completion",
+      "created":
+      int(time.time()),
+      "model":
+      body["model"],
+      "choices": [
+          {
+              "index": 0,
+              "message": {
+                  "role": "assistant",
+                  "content": "".join(tokens)
+              },
+              "finish_reason": "stop"
+          }
+      ],
+      "usage":
+      usage
+  }
+
+async def _stream(model: str, tokens: list[str],
+                  usage: dict[str, int] | None) -> AsyncIterator[str]:
+
+  def chunk(choices: list[dict[str, Any]], **extra: Any) -> str:
+    data = dict(
+        id="chatcmpl-bench",
+        object="chat.completion.chunk",
+        created=int(time.time()),
+        model=model,
+        choices=choices,
+        **extra)
+    return f"data: {json.dumps(data)}\n\n"
+
+  for token in tokens:
+    await asyncio.sleep(settings.token_delay)
+    yield chunk([dict(index=0, delta={"content": token}, finish_reason=None)])
+  yield chunk([dict(index=0, delta={}, finish_reason="stop")])
+  if usage is not None:
+    yield chunk([], usage=usage)
+  yield "data: [DONE]\n\n"
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--port", type=int, default=8100)
+  parser.add_argument(
+      "--latency",
+      type=float,
+      default=settings.latency,
+      help="Seconds before a response starts.")
+  parser.add_argument(
+      "--token-delay",
+      type=float,
+      default=settings.token_delay,
+      help="Seconds between streamed tokens.")
+  parser.add_argument(
+      "--completion-tokens", type=int, default=settings.completion_tokens)
+  parser.add_argument(
+      "--rate-limit-ratio",
+      type=float,
+      default=settings.rate_limit_ratio,
+      help="Share of completions answered with 429.")
+  parser.add_argument("--seed", type=int, default=None)
+  args = parser.parse_args()
+  settings.latency = args.latency
+  settings.token_delay = args.token_delay
+  settings.completion_tokens = args.completion_tokens
+  settings.rate_limit_ratio = args.rate_limit_ratio
+  random.seed(args.seed)
+  uvicorn.run(app, port=args.port, log_level="warning", access_log=False)
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,367 @@
+"""Benchmarks the API and the job pipeline against a stub LLM provider.
+
+Starts the stub server of `fake_openai.py` and, for every `--concurrency`
+value, the app on a fresh SQLite database (`serve.py`), then measures:
+
+- CRUD throughput and latency percentiles per operation,
+- the job submission rate,
+- end-to-end throughput of strategy and calendar jobs.
+
+The results are written as JSON; `compare.py` diffs two runs, e.g. of two
+commits:
+
+  python benchmarks/run.py --concurrency 1 8 50 --output base.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+import httpx
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCHMARKS_DIR.parent / "src"
+
+Call = Callable[[int], Awaitable[httpx.Response]]
+
+def _free_port() -> int:
+  with socket.socket() as sock:
+    sock.bind(("127.0.0.1", 0))
+    return sock.getsockname()[1]
+
+def _start(script: str, *args: str, **env: str) -> subprocess.Popen:
+  python_path = os.pathsep.join(
+      filter(None, [str(SRC_DIR), os.environ.get("PYTHONPATH")]))
+  return subprocess.Popen(
+      [sys.executable, str(BENCHMARKS_DIR / script), *args],
+      env=os.environ | env | {"PYTHONPATH": python_path})
+
+def _cli_args(**options: Any) -> list[str]:
+  return [
+      arg for name, value in options.items()
+      for arg in (f"--{name.replace('_', '-')}", str(value))
+  ]
+
+def _stop(process: subprocess.Popen) -> None:
+  process.terminate()
+  try:
+    process.wait(timeout=10)
+  except subprocess.TimeoutExpired:
+    process.kill()
+
+async def _wait_ready(url: str, timeout: float = 30.0) -> None:
+  deadline = time.monotonic() + timeout
+  async with httpx.AsyncClient() as client:
+    while True:
+      try:
+        (await client.get(url)).raise_for_status()
+        return
+      except httpx.HTTPError:
+        if time.monotonic() > deadline:
+          raise
+        await asyncio.sleep(0.1)
+
+def _percentile(values: list[float], share: float) -> float:
+  # Nearest rank
+  index = max(0, min(len(values) - 1, round(share * len(values)) - 1))
+  return values[index]
+
+def _summarize(latencies: list[float], errors: int,
+               elapsed: float) -> dict[str, Any]:
+  latencies = sorted(latencies)
+  stats: dict[str, Any] = dict(
+      requests=len(latencies) + errors,
+      errors=errors,
+      seconds=round(elapsed, 3),
+      throughput=round(len(latencies) / elapsed, 1) if elapsed else None)
+  if latencies:
+    for name, share in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+      stats[f"{name}_ms"] = round(_percentile(latencies, share) * 1000, 2)
+    stats["max_ms"] = round(latencies[-1] * 1000, 2)
+  return stats
+
+async def _measure(count: int, clients: int, call: Call) -> dict[str, Any]:
+  """Makes `count` calls from `clients` concurrent workers."""
+  indices = iter(range(count))
+  latencies: list[float] = []
+  errors = 0
+
+  async def worker():
+    nonlocal errors
+    for i in indices:
+      started = time.perf_counter()
+      try:
+        response = await call(i)
+        response.raise_for_status()
+      except httpx.HTTPError:
+        errors += 1
+      else:
+        latencies.append(time.perf_counter() - started)
+
+  started = time.perf_counter()
+  async with asyncio.TaskGroup() as tg:
+    for _ in range(min(clients, count)):
+      tg.create_task(worker())
+  return _summarize(latencies, errors, time.perf_counter() - started)
+
+def _goal(i: int) -> dict[str, Any]:
+  return dict(
+      title=f"Goal {i}",
+      description=f"Benchmark goal number {i}.",
+      initial_progress="Not started.",
+      strategy_guidelines="Small daily steps.")
+
+async def bench_crud(client: httpx.AsyncClient, requests: int,
+                     clients: int) -> dict[str, Any]:
+  ids: list[int] = [0] * requests
+
+  async def create(i: int) -> httpx.Response:
+    response = await client.post("/goals", json=_goal(i))
+    if response.is_success:
+      ids[i] = response.json()["id"]
+    return response
+
+  operations: dict[str, Call] = dict(
+      create=create,
+      read_one=lambda i: client.get(f"/goals/{ids[i]}"),
+      read_all=lambda i: client.get("/goals", params={"limit": 100}),
+      update=lambda i: client.patch(
+          f"/goals/{ids[i]}", json={"title": f"Goal {i} (updated)"}),
+      delete=lambda i: client.delete(f"/goals/{ids[i]}"))
+  return {
+      name: await _measure(requests, clients, call)
+      for name, call in operations.items()
+  }
+
+async def _setup_llm(client: httpx.AsyncClient, fake_url: str) -> int:
+  """Registers the stub provider and returns the id of one of its models."""
+  response = await client.post(
+      "/openai-api-providers", json=dict(name="bench", base_url=fake_url))
+  response.raise_for_status()
+  provider_id = response.json()["id"]
+  response = await client.post(
+      f"/openai-api-providers/{provider_id}/keys", json={"key": "bench"})
+  response.raise_for_status()
+  response = await client.post(
+      f"/openai-api-providers/{provider_id}/models/refresh")
+  response.raise_for_status()
+  return response.json()[0]["id"]
+
+async def _wait_jobs(
+    client: httpx.AsyncClient, job_ids: list[int],
+    timeout: float) -> dict[str, int]:
+  """Waits for the jobs to finish and returns their count per status."""
+  deadline = time.monotonic() + timeout
+  while True:
+    response = await client.post("/jobs/batch", json={"job_ids": job_ids})
+    response.raise_for_status()
+    statuses: dict[str, int] = {}
+    for job in response.json():
+      statuses[job["status"]] = statuses.get(job["status"], 0) + 1
+    unfinished = {"pending", "running"} & statuses.keys()
+    # Unfinished jobs remain in the counts on a timeout
+    if not unfinished or time.monotonic() > deadline:
+      return statuses
+    await asyncio.sleep(0.05)
+
+async def _run_jobs(
+    client: httpx.AsyncClient, count: int, clients: int, submit: Call,
+    timeout: float) -> dict[str, Any]:
+  job_ids: list[int] = [0] * count
+
+  async def call(i: int) -> httpx.Response:
+    response = await submit(i)
+    if response.is_success:
+      job_ids[i] = response.json()["id"]
+    return response
+
+  started = time.perf_counter()
+  submission = await _measure(count, clients, call)
+  statuses = await _wait_jobs(client, [i for i in job_ids if i], timeout)
+  elapsed = time.perf_counter() - started
+  return dict(
+      submission=submission,
+      statuses=statuses,
+      seconds=round(elapsed, 3),
+      jobs_per_second=round(statuses.get("done", 0) / elapsed, 2))
+
+def _llm_requests(metrics: str) -> dict[str, float]:
+  """Sums `psyche_llm_requests_total` by outcome."""
+  outcomes: dict[str, float] = {}
+  for match in re.finditer(
+      r'^psyche_llm_requests_total\{.*outcome="([^"]*)".*\} (\S+)$', metrics,
+      re.MULTILINE):
+    outcome, value = match.group(1), float(match.group(2))
+    outcomes[outcome] = outcomes.get(outcome, 0.0) + value
+  return outcomes
+
+async def bench_jobs(
+    client: httpx.AsyncClient, args: argparse.Namespace,
+    fake_url: str) -> dict[str, Any]:
+  model_id = await _setup_llm(client, fake_url)
+  response = await client.post(
+      "/goals:batchCreate", json=[_goal(i) for i in range(args.jobs)])
+  response.raise_for_status()
+  goal_ids = [result["id"] for result in response.json()]
+
+  def generate_strategy(i: int) -> Awaitable[httpx.Response]:
+    return client.post(
+        f"/goals/{goal_ids[i]}/strategy:generate",
+        json=dict(model_id=model_id, stream=args.stream, use_cache=False))
+
+  first_day = date(2030, 1, 1)
+  last_day = first_day + timedelta(days=args.calendar_days - 1)
+
+  def generate_calendar(i: int) -> Awaitable[httpx.Response]:
+    return client.post(
+        "/calendar:generate",
+        params={"date": (first_day + timedelta(days=i)).isoformat()},
+        json=dict(model_id=model_id, use_cache=False))
+
+  strategy = await _run_jobs(
+      client, len(goal_ids), args.clients, generate_strategy, args.timeout)
+  calendar = await _run_jobs(
+      client, args.calendar_days, args.clients, generate_calendar, args.timeout)
+  response = await client.get(
+      "/calendar/days",
+      params={
+          "from": first_day.isoformat(),
+          "to": last_day.isoformat()
+      })
+  response.raise_for_status()
+  activities = sum(len(day["activities"]) for day in response.json())
+  calendar["activities_per_second"] = round(activities / calendar["seconds"], 2)
+
+  response = await client.get("/metrics")
+  response.raise_for_status()
+  return dict(
+      strategy=strategy,
+      calendar=calendar,
+      llm_requests=_llm_requests(response.text))
+
+async def bench_app(
+    args: argparse.Namespace, fake_url: str, max_concurrent_jobs: int,
+    with_crud: bool) -> dict[str, Any]:
+  port = _free_port()
+  with tempfile.TemporaryDirectory() as tmp:
+    app = _start(
+        "serve.py",
+        *_cli_args(port=port),
+        SQLITE_DB_FILENAME=str(Path(tmp) / "bench.sqlite"),
+        SQLITE_TUNED="1" if args.tuned else "",
+        PSYCHE_MAX_CONCURRENT_JOBS=str(max_concurrent_jobs))
+    try:
+      base_url = f"http://127.0.0.1:{port}"
+      await _wait_ready(f"{base_url}/metrics")
+      limits = httpx.Limits(max_connections=args.clients * 2)
+      client = httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0)
+      async with client:
+        result: dict[str, Any] = {}
+        if with_crud:
+          result["crud"] = await bench_crud(
+              client, args.crud_requests, args.clients)
+        result["jobs"] = await bench_jobs(client, args, fake_url)
+        return result
+    finally:
+      _stop(app)
+
+def _commit() -> str | None:
+  try:
+    return subprocess.check_output(
+        ["git", "rev-parse", "HEAD"], cwd=BENCHMARKS_DIR, text=True).strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+  fake_port = _free_port()
+  fake = _start(
+      "fake_openai.py",
+      *_cli_args(
+          port=fake_port,
+          latency=args.latency,
+          token_delay=args.token_delay,
+          rate_limit_ratio=args.rate_limit_ratio,
+          seed=0))
+  fake_url = f"http://127.0.0.1:{fake_port}/v1"
+  try:
+    await _wait_ready(f"{fake_url}/models")
+    created_at = datetime.now(timezone.utc).isoformat()
+    crud = None
+    jobs = []
+    for i, concurrency in enumerate(args.concurrency):
+      result = await bench_app(args, fake_url, concurrency, with_crud=i == 0)
+      crud = result.get("crud", crud)
+      jobs.append(dict(max_concurrent_jobs=concurrency, **result["jobs"]))
+    return dict(
+        commit=_commit(),
+        created_at=created_at,
+        python=platform.python_version(),
+        settings=vars(args),
+        crud=crud,
+        jobs=jobs)
+  finally:
+    _stop(fake)
+
+def main():
+  parser = argparse.ArgumentParser(
+      description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+  parser.add_argument(
+      "--concurrency",
+      type=int,
+      nargs="+",
+      default=[1, 8, 50],
+      help="JobManager.max_concurrent_jobs values to run the jobs with.")
+  parser.add_argument(
+      "--clients", type=int, default=16, help="Concurrent HTTP clients.")
+  parser.add_argument(
+      "--crud-requests",
+      type=int,
+      default=1000,
+      help="Requests per CRUD operation.")
+  parser.add_argument(
+      "--jobs",
+      type=int,
+      default=100,
+      help="Goals, i.e. strategy jobs and LLM calls per calendar job.")
+  parser.add_argument("--calendar-days", type=int, default=5)
+  parser.add_argument(
+      "--stream", action="store_true", help="Stream the strategy jobs.")
+  parser.add_argument(
+      "--tuned", action="store_true", help="Run with SQLITE_TUNED.")
+  parser.add_argument(
+      "--latency",
+      type=float,
+      default=0.2,
+      help="Seconds before the stub provider responds.")
+  parser.add_argument("--token-delay", type=float, default=0.005)
+  parser.add_argument(
+      "--rate-limit-ratio",
+      type=float,
+      default=0.0,
+      help="Share of LLM requests answered with 429.")
+  parser.add_argument(
+      "--timeout",
+      type=float,
+      default=600.0,
+      help="Seconds to wait for the jobs of a run.")
+  parser.add_argument(
+      "--output", type=Path, help="Result file, stdout by default.")
+  args = parser.parse_args()
+  report = json.dumps(asyncio.run(run(args)), indent=2, default=str)
+  if args.output:
+    args.output.write_text(report + "\n")
+  else:
+    print(report)
+
+if __name__ == "__main__":
+  main()
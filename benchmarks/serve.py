@@ -0,0 +1,36 @@
+"""Runs the app for benchmarks: creates the tables of the database set in
+`SQLITE_DB_FILENAME` and serves the API with jobs running in-process.
+
+Logging is left unconfigured so it doesn't skew the measurements.
+"""
+import argparse
+import asyncio
+import uvicorn
+from sqlalchemy import create_engine
+from psyche.database import SQLITE_DB_FILENAME
+from psyche.fastapi_app import app
+from psyche.job_manager import get_job_manager
+from psyche.models import Base
+from psyche.prompting import compile_templates
+
+async def serve(port: int):
+  config = uvicorn.Config(
+      app, port=port, log_config=None, log_level="warning", access_log=False)
+  server = uvicorn.Server(config)
+  async with asyncio.TaskGroup() as tg:
+    tg.create_task(get_job_manager().run())
+    tg.create_task(server.serve())
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--port", type=int, default=8000)
+  args = parser.parse_args()
+  Base.metadata.create_all(create_engine(f"sqlite:///{SQLITE_DB_FILENAME}"))
+  compile_templates()
+  try:
+    asyncio.run(serve(args.port))
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,144 @@
+"""Measures how long the app takes to start serving.
+
+Each run boots `python -m psyche.main` against the same temporary database
+and times the spawn until the first successful response. The first run
+starts cold; later runs are restarts with an up-to-date schema, as in
+rolling deploys. The import time of the app module is measured separately.
+
+  python benchmarks/startup.py --runs 5 --output startup.json
+
+The target of restarts well under one second is not met yet. Median restarts
+measure 0.93 s to 1.2 s depending on the machine, of which about 0.65 s is
+importing the app. Most of that is fastapi, pydantic, SQLAlchemy and the ORM
+models, which every route needs before the server accepts connections.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+import httpx
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+def _free_port() -> int:
+  with socket.socket() as sock:
+    sock.bind(("127.0.0.1", 0))
+    return sock.getsockname()[1]
+
+def _alembic_config(tmp: Path, db: Path) -> None:
+  """Writes an alembic.ini migrating `db` with the repository's scripts."""
+  (tmp / "alembic.ini").write_text(
+      (REPO_DIR / "alembic.ini").read_text().replace(
+          "%(here)s/alembic", str(REPO_DIR / "alembic")).replace(
+              "sqlite:///db.sqlite", f"sqlite:///{db}"))
+
+def _env(db: Path) -> dict[str, str]:
+  python_path = os.pathsep.join(
+      filter(None, [str(REPO_DIR / "src"),
+                    os.environ.get("PYTHONPATH")]))
+  return os.environ | {"SQLITE_DB_FILENAME": str(db), "PYTHONPATH": python_path}
+
+def _boot(
+    client: httpx.Client, tmp: Path, env: dict[str, str],
+    timeout: float) -> float:
+  port = _free_port()
+  url = f"http://127.0.0.1:{port}/metrics"
+  started = time.perf_counter()
+  process = subprocess.Popen(
+      [sys.executable, "-m", "psyche.main", "--port",
+       str(port)],
+      cwd=tmp,
+      env=env,
+      stdout=subprocess.DEVNULL,
+      stderr=subprocess.DEVNULL)
+  try:
+    while True:
+      try:
+        if client.get(url).is_success:
+          return time.perf_counter() - started
+      except httpx.TransportError:
+        pass
+      if process.poll() is not None:
+        raise RuntimeError(f"The app exited with {process.returncode}.")
+      if time.perf_counter() - started > timeout:
+        raise TimeoutError("The app didn't start in time.")
+      time.sleep(0.01)
+  finally:
+    process.terminate()
+    process.wait()
+
+def _import_time(env: dict[str, str]) -> float:
+  script = (
+      "import time; started = time.perf_counter(); "
+      "import psyche.fastapi_app; print(time.perf_counter() - started)")
+  output = subprocess.check_output([sys.executable, "-c", script], env=env)
+  return float(output)
+
+def _commit() -> str | None:
+  try:
+    return subprocess.check_output(
+        ["git", "rev-parse", "HEAD"], cwd=REPO_DIR, text=True).strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def _ms(seconds: float) -> float:
+  return round(seconds * 1000, 1)
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    tmp = Path(tmp_dir)
+    db = tmp / "bench.sqlite"
+    _alembic_config(tmp, db)
+    env = _env(db)
+    if not (REPO_DIR / "alembic" / "versions").is_dir():
+      # No migration scripts to create the tables from
+      manage = [sys.executable, str(REPO_DIR / "manage.py"), "--db", str(db)]
+      subprocess.run(
+          [*manage, "create-tables"],
+          env=env,
+          check=True,
+          stdout=subprocess.DEVNULL)
+    with httpx.Client() as client:
+      boots = [_boot(client, tmp, env, args.timeout) for _ in range(args.runs)]
+    imports = [_import_time(env) for _ in range(args.runs)]
+  restarts = boots[1:] or boots
+  return dict(
+      commit=_commit(),
+      created_at=datetime.now(timezone.utc).isoformat(),
+      python=platform.python_version(),
+      settings=vars(args),
+      cold_start_ms=_ms(boots[0]),
+      restart_ms=dict(
+          min=_ms(min(restarts)),
+          median=_ms(statistics.median(restarts)),
+          max=_ms(max(restarts))),
+      import_ms=dict(
+          min=_ms(min(imports)), median=_ms(statistics.median(imports))),
+      runs_ms=[_ms(boot) for boot in boots])
+
+def main():
+  parser = argparse.ArgumentParser(
+      description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+  parser.add_argument("--runs", type=int, default=5)
+  parser.add_argument(
+      "--timeout", type=float, default=60.0, help="Seconds to wait per boot.")
+  parser.add_argument(
+      "--output", type=Path, help="Result file, stdout by default.")
+  args = parser.parse_args()
+  report = json.dumps(run(args), indent=2, default=str)
+  if args.output:
+    args.output.write_text(report + "\n")
+  else:
+    print(report)
+
+if __name__ == "__main__":
+  main()
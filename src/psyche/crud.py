@@ -1,15 +1,92 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from collections.abc import Iterable
 from enum import Enum
-from typing import Type, TypeVar, Literal
-from pydantic import BaseModel
-from fastapi import APIRouter, HTTPException, Request
-from sqlalchemy import select
+from typing import Annotated, Any, Type, TypeVar, Literal
+from pydantic import BaseModel, create_model
+from fastapi import APIRouter, Body, HTTPException, Query, Request, Response
+from sqlalchemy import delete, func, inspect, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.types import Integer
 from psyche.models.mixins import IDMixin
-from psyche.fastapi_deps import SessionDep
+from psyche.database import write_queue
+from psyche.fastapi_deps import ReadSessionDep
+from psyche.responses import FastJSONResponse
+from psyche.table_versions import CacheHeaders, conditional_get
+from psyche.schemas.crud_schemas import BatchDeleteRequest, BatchItemResult
 
 ModelType = TypeVar("ModelType", bound=IDMixin)
 AllowedMethods = Literal["read_all", "read_one", "create", "update", "delete"]
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_SIZE = 1000
+
+def _encode_cursor(values: list[Any]) -> str:
+  raw = json.dumps(
+      [v.isoformat() if isinstance(v, date) else v for v in values])
+  return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, columns: list) -> list[Any]:
+  try:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    values = json.loads(raw)
+    if not isinstance(values, list) or len(values) != len(columns):
+      raise ValueError()
+    decoded = []
+    for column, value in zip(columns, values):
+      python_type = column.type.python_type
+      if python_type in (date, datetime):
+        value = python_type.fromisoformat(value)
+      decoded.append(value)
+    return decoded
+  except (binascii.Error, ValueError, TypeError):
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def _get_many(
+    db: AsyncSession, model: Type[ModelType],
+    ids: Iterable[int]) -> dict[int, ModelType]:
+  result = await db.scalars(
+      select(model).where(
+          model.id.in_(ids)).execution_options(populate_existing=True))
+  return {item.id: item for item in result.all()}
+
+async def _update_many(
+    db: AsyncSession, model: Type[ModelType],
+    values_by_id: dict[int, dict[str, Any]]) -> dict[int, ModelType]:
+  """Applies per-row updates with one `UPDATE ... WHERE id IN` per distinct
+  set of values and returns the updated rows by id."""
+  if inspect(model).dispatch.before_update:
+    # Models with mapper-level update hooks need ORM updates to run them
+    items = await _get_many(db, model, values_by_id)
+    for id, item in items.items():
+      for key, value in values_by_id[id].items():
+        setattr(item, key, value)
+    await db.flush()
+    return await _get_many(db, model, items)
+
+  found = set(
+      await db.scalars(select(model.id).where(model.id.in_(values_by_id))))
+  groups: dict[str, tuple[dict[str, Any], list[int]]] = {}
+  for id, values in values_by_id.items():
+    if id in found and values:
+      group_key = json.dumps(values, sort_keys=True, default=str)
+      groups.setdefault(group_key, (values, []))[1].append(id)
+  for values, ids in groups.values():
+    await db.execute(
+        update(model).where(model.id.in_(ids)).values(**values),
+        execution_options={"synchronize_session": False})
+  return await _get_many(db, model, found)
+
+async def _delete_many(
+    db: AsyncSession, model: Type[ModelType], ids: list[int]) -> set[int]:
+  result = await db.scalars(
+      delete(model).where(model.id.in_(ids)).returning(model.id),
+      execution_options={"synchronize_session": False})
+  return set(result.all())
+
 def add_crud_routes(
     *,
     router: APIRouter,
@@ -24,22 +101,71 @@ def add_crud_routes(
     ],
     url_param_to_field: dict[str, str] = {},
     query_param_to_field: dict[str, str] = {},
+    order_by: list[str] = ["id"],
+    projection: bool = False,
 ) -> None:
+  """Adds generic CRUD routes for `model` to `router`.
+
+  `read_all` pages through rows in `order_by` order (`id` is always the final
+  tie-breaker) with keyset pagination. The next page's opaque cursor is sent
+  in the `X-Next-Cursor` header, and `include_total=true` adds the number of
+  matching rows as `X-Total-Count`. Reads carry ETags derived from the
+  table's version and answer matching `If-None-Match` requests with 304.
+  With `projection`, it selects only the `read_schema` columns and encodes the
+  rows to JSON directly, without ORM instances or response validation; every
+  read field must then be a column.
+
+  Each write method also gets a batch variant (`:batchCreate`, `:batchUpdate`,
+  `:batchDelete`) that applies up to `MAX_BATCH_SIZE` items in one transaction
+  and returns a result per item.
+  """
+  sort_fields = order_by if "id" in order_by else [*order_by, "id"]
+  table = model.__tablename__
 
   def get_typed_value(raw_val: str, column):
     if isinstance(column.type, Integer):
       return int(raw_val)
     return raw_val
 
+  def get_url_values(request: Request) -> dict[str, Any]:
+    values = {}
+    for url_param, field_name in url_param_to_field.items():
+      raw_val = request.path_params[url_param]
+      values[field_name] = get_typed_value(raw_val, getattr(model, field_name))
+    return values
+
+  def to_result(id: int, item: ModelType | None) -> BatchItemResult:
+    if item is None:
+      return BatchItemResult(id=id, status=404, detail="Item not found")
+    return BatchItemResult(
+        id=id,
+        status=200,
+        item=read_schema.model_validate(item)
+        if read_schema is not None else None)
+
+  batch_result_schema = list[BatchItemResult[read_schema]
+                             if read_schema is not None else BatchItemResult]
+
   if "read_all" in methods and read_schema is not None:
+    read_fields = list(read_schema.model_fields)
+    if projection and not set(sort_fields) <= set(read_fields):
+      raise ValueError("Projected read_all needs the sort fields in its schema")
 
     @router.get(f"{prefix}", response_model=list[read_schema], tags=tags)
     async def read_all(
         request: Request,
-        db: SessionDep,
-        skip: int = 0,
-        limit: int | None = None):
-      stmt = select(model)
+        response: Response,
+        db: ReadSessionDep,
+        cursor: str | None = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        include_total: bool = False,
+        skip: int = Query(0, ge=0, deprecated=True),
+        cache_headers: CacheHeaders = conditional_get(table)):
+      if projection:
+        stmt = select(*(getattr(model, field) for field in read_fields))
+      else:
+        stmt = select(model)
+      headers = dict(cache_headers)
 
       for url_param, field_name in url_param_to_field.items():
         raw_val = request.path_params[url_param]
@@ -52,17 +178,45 @@ def add_crud_routes(
           column = getattr(model, field_name)
           stmt = stmt.where(column == get_typed_value(raw_val, column))
 
-      stmt = stmt.offset(skip)
-      if limit is not None:
-        stmt = stmt.limit(limit)
+      if include_total:
+        total = await db.scalar(
+            select(func.count()).select_from(stmt.subquery()))
+        headers["X-Total-Count"] = str(total)
 
-      result = await db.scalars(stmt)
-      return result.all()
+      sort_columns = [getattr(model, field) for field in sort_fields]
+      if cursor is not None:
+        after = _decode_cursor(cursor, sort_columns)
+        stmt = stmt.where(tuple_(*sort_columns) > tuple_(*after))
+      stmt = stmt.order_by(*sort_columns).offset(skip).limit(limit + 1)
+
+      if projection:
+        result = await db.execute(stmt)
+        items = [dict(row) for row in result.mappings()]
+      else:
+        result = await db.scalars(stmt)
+        items = result.all()
+      if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        headers["X-Next-Cursor"] = _encode_cursor(
+            [
+                last[field] if projection else getattr(last, field)
+                for field in sort_fields
+            ])
+
+      if projection:
+        return FastJSONResponse(items, headers=headers)
+      response.headers.update(headers)
+      return items
 
   if "read_one" in methods and read_schema is not None:
 
-    @router.get(f"{prefix}/{{id}}", response_model=read_schema, tags=tags)
-    async def read_one(id: int, db: SessionDep):
+    @router.get(
+        f"{prefix}/{{id}}",
+        response_model=read_schema,
+        tags=tags,
+        dependencies=[conditional_get(table)])
+    async def read_one(id: int, db: ReadSessionDep):
       item = await db.get(model, id)
       if item is None:
         raise HTTPException(status_code=404, detail="Item not found")
@@ -71,48 +225,110 @@ def add_crud_routes(
   if "create" in methods and create_schema is not None:
 
     @router.post(f"{prefix}", response_model=read_schema, tags=tags)
-    async def create(request: Request, item: BaseModel, db: SessionDep):
-      item_data = item.model_dump()
+    async def create(request: Request, item: BaseModel):
+      item_data = item.model_dump() | get_url_values(request)
 
-      for url_param, field_name in url_param_to_field.items():
-        raw_val = request.path_params[url_param]
-        column = getattr(model, field_name)
-        if isinstance(column.type, Integer):
-          item_data[field_name] = int(raw_val)
-        else:
-          item_data[field_name] = raw_val
+      async def write(db: AsyncSession):
+        db_item = model(**item_data)
+        db.add(db_item)
+        await db.flush()
+        await db.refresh(db_item)
+        return db_item
 
-      db_item = model(**item_data)
-      db.add(db_item)
-      await db.commit()
-      await db.refresh(db_item)
-      return db_item
+      return await write_queue.submit(write)
 
     create.__annotations__["item"] = create_schema
 
+    @router.post(
+        f"{prefix}:batchCreate", response_model=batch_result_schema, tags=tags)
+    async def batch_create(request: Request, items: list[BaseModel]):
+      url_values = get_url_values(request)
+
+      async def write(db: AsyncSession):
+        db_items = [model(**(item.model_dump() | url_values)) for item in items]
+        # The unit of work sends these as batched multi-row INSERTs
+        db.add_all(db_items)
+        await db.flush()
+        loaded = await _get_many(
+            db, model, [db_item.id for db_item in db_items])
+        return [
+            to_result(db_item.id, loaded[db_item.id]) for db_item in db_items
+        ]
+
+      return await write_queue.submit(write)
+
+    batch_create.__annotations__["items"] = Annotated[
+        list[create_schema],
+        Body(max_length=MAX_BATCH_SIZE)]
+
   if "update" in methods and update_schema is not None:
 
     @router.patch(f"{prefix}/{{id}}", response_model=read_schema, tags=tags)
-    async def update(id: int, item: BaseModel, db: SessionDep):
-      db_item = await db.get(model, id)
-      if db_item is None:
-        raise HTTPException(status_code=404, detail="Item not found")
-      for key, value in item.model_dump(exclude_unset=True).items():
-        setattr(db_item, key, value)
+    async def update(id: int, item: BaseModel):
+      values = item.model_dump(exclude_unset=True)
 
-      await db.commit()
-      await db.refresh(db_item)
-      return db_item
+      async def write(db: AsyncSession):
+        db_item = await db.get(model, id)
+        if db_item is None:
+          raise HTTPException(status_code=404, detail="Item not found")
+        for key, value in values.items():
+          setattr(db_item, key, value)
+        await db.flush()
+        await db.refresh(db_item)
+        return db_item
+
+      return await write_queue.submit(write)
 
     update.__annotations__["item"] = update_schema
 
+    batch_update_schema = create_model(
+        f"{update_schema.__name__}Item", __base__=update_schema, id=(int, ...))
+
+    @router.patch(
+        f"{prefix}:batchUpdate", response_model=batch_result_schema, tags=tags)
+    async def batch_update(items: list[BaseModel]):
+      # Later items win over earlier ones for the same id
+      values_by_id = {
+          item.id: item.model_dump(exclude_unset=True, exclude={"id"})
+          for item in items
+      }
+
+      async def write(db: AsyncSession):
+        updated = await _update_many(db, model, values_by_id)
+        return [to_result(item.id, updated.get(item.id)) for item in items]
+
+      return await write_queue.submit(write)
+
+    batch_update.__annotations__["items"] = Annotated[
+        list[batch_update_schema],
+        Body(max_length=MAX_BATCH_SIZE)]
+
   if "delete" in methods:
 
     @router.delete(f"{prefix}/{{id}}", tags=tags)
-    async def delete(id: int, db: SessionDep):
-      db_item = await db.get(model, id)
-      if db_item is None:
-        raise HTTPException(status_code=404, detail="Item not found")
-      await db.delete(db_item)
-      await db.commit()
+    async def delete(id: int):
+
+      async def write(db: AsyncSession):
+        db_item = await db.get(model, id)
+        if db_item is None:
+          raise HTTPException(status_code=404, detail="Item not found")
+        await db.delete(db_item)
+
+      await write_queue.submit(write)
       return {"message": "Item deleted"}
+
+    @router.post(
+        f"{prefix}:batchDelete",
+        response_model=list[BatchItemResult],
+        tags=tags)
+    async def batch_delete(payload: BatchDeleteRequest):
+      if len(payload.ids) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=422, detail=f"At most {MAX_BATCH_SIZE} ids per batch")
+      deleted = await write_queue.submit(
+          lambda db: _delete_many(db, model, payload.ids))
+      return [
+          BatchItemResult(id=id, status=200) if id in deleted else
+          BatchItemResult(id=id, status=404, detail="Item not found")
+          for id in payload.ids
+      ]
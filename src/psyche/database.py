@@ -1,31 +1,236 @@
+import ast
+import asyncio
+import configparser
+import logging
 import os
-from alembic import command
-from alembic.config import Config
+import sqlite3
+from collections.abc import Awaitable, Callable
+from contextlib import closing
+from pathlib import Path
+from typing import Any, TypeVar
 from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
 SQLITE_DB_FILENAME = os.getenv("SQLITE_DB_FILENAME", "db.sqlite")
 SQLITE_DB_URL = f"sqlite+aiosqlite:///{SQLITE_DB_FILENAME}"
+# Tuned mode: WAL, a pool of read-only connections for reads and a single
+# writer connection fed by `write_queue`.
+SQLITE_TUNED = os.getenv("SQLITE_TUNED", "").lower() in ("1", "true", "yes")
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+
+TUNED_PRAGMAS = [
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+]
 
-engine = create_async_engine(SQLITE_DB_URL)
+if SQLITE_TUNED:
+  # In-process writers queue for the one connection instead of retrying on
+  # a locked database.
+  engine = create_async_engine(
+      SQLITE_DB_URL, pool_size=1, max_overflow=0, pool_timeout=60)
+  read_engine = create_async_engine(
+      SQLITE_DB_URL, pool_size=SQLITE_READ_POOL_SIZE, max_overflow=0)
+else:
+  engine = create_async_engine(SQLITE_DB_URL)
+  read_engine = engine
 
 @event.listens_for(engine.sync_engine, "connect")
 def set_sqlite_pragma(dbapi_connection, connection_record):
   cursor = dbapi_connection.cursor()
   cursor.execute("PRAGMA foreign_keys=ON")
+  if SQLITE_TUNED:
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    for pragma in TUNED_PRAGMAS:
+      cursor.execute(pragma)
   cursor.close()
+  if SQLITE_TUNED:
+    # Let SQLAlchemy emit BEGIN itself, see `begin_immediate`
+    dbapi_connection.isolation_level = None
+
+if SQLITE_TUNED:
+
+  @event.listens_for(engine.sync_engine, "begin")
+  def begin_immediate(conn):
+    # Take the write lock up front: a deferred transaction that upgrades to a
+    # write fails with SQLITE_BUSY in WAL mode instead of waiting for it.
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+  @event.listens_for(read_engine.sync_engine, "connect")
+  def set_sqlite_read_pragma(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    for pragma in TUNED_PRAGMAS:
+      cursor.execute(pragma)
+    cursor.close()
+
+ALEMBIC_CONFIG = "alembic.ini"
 
 def run_migrations():
-  alembic_cfg = Config("alembic.ini")
+  """Upgrades the database to the head revision.
+
+  Alembic is only loaded when the stored revision differs from head, so
+  restarts against an up-to-date database skip it.
+  """
+  if _schema_is_current(ALEMBIC_CONFIG):
+    logger.debug("Database schema is at head, skipping migrations.")
+    return
+  from alembic import command
+  from alembic.config import Config
+
+  alembic_cfg = Config(ALEMBIC_CONFIG)
   alembic_cfg.attributes["configure_logger"] = False
   command.upgrade(alembic_cfg, "head")
 
+def _schema_is_current(config_file: str) -> bool:
+  """Compares the revisions stored in the database with the heads of the
+  migration scripts, without loading alembic.
+
+  Returns False whenever the setup is one this check doesn't understand.
+  """
+  here = os.path.dirname(os.path.abspath(config_file))
+  config = configparser.ConfigParser(defaults={"here": here})
+  if not config.read(config_file) or not config.has_section("alembic"):
+    return False
+  section = config["alembic"]
+  url = section.get("sqlalchemy.url", "")
+  if not url.startswith("sqlite:///") or "version_locations" in section:
+    return False
+  heads = _head_revisions(Path(section["script_location"]) / "versions")
+  if heads is None:
+    return False
+  db_uri = f"file:{url.removeprefix('sqlite:///')}?mode=ro"
+  try:
+    with closing(sqlite3.connect(db_uri, uri=True)) as conn:
+      rows = conn.execute("SELECT version_num FROM alembic_version")
+      stored = {version for version, in rows}
+  except sqlite3.Error:
+    # No database or no migrations applied yet
+    stored = set()
+  return stored == heads
+
+def _head_revisions(versions_dir: Path) -> set[str] | None:
+  """Returns the revisions no other script builds on, or None if a script
+  can't be read statically."""
+  revisions = set()
+  parents = set()
+  for path in versions_dir.glob("*.py"):
+    try:
+      values = _literal_assignments(path, ("revision", "down_revision"))
+    except (SyntaxError, ValueError, TypeError):
+      return None
+    if not isinstance(values.get("revision"), str):
+      return None
+    revisions.add(values["revision"])
+    down_revision = values.get("down_revision")
+    if isinstance(down_revision, str):
+      parents.add(down_revision)
+    elif down_revision is not None:
+      parents.update(down_revision)
+  return revisions - parents
+
+def _literal_assignments(path: Path, names: tuple[str, ...]) -> dict[str, Any]:
+  values = {}
+  for node in ast.parse(path.read_bytes()).body:
+    if isinstance(node, ast.Assign) and len(node.targets) == 1:
+      target, value = node.targets[0], node.value
+    elif isinstance(node, ast.AnnAssign) and node.value is not None:
+      target, value = node.target, node.value
+    else:
+      continue
+    if isinstance(target, ast.Name) and target.id in names:
+      values[target.id] = ast.literal_eval(value)
+  return values
+
 SessionLocal = async_sessionmaker(
     bind=engine, class_=AsyncSession, expire_on_commit=False)
+ReadSessionLocal = async_sessionmaker(
+    bind=read_engine, class_=AsyncSession, expire_on_commit=False)
 
 async def get_db():
   async with SessionLocal() as session:
     yield session
+
+async def get_read_db():
+  async with ReadSessionLocal() as session:
+    yield session
+
+WriteFn = Callable[[AsyncSession], Awaitable[Any]]
+
+class WriteQueue:
+  """Group-commits queued writes on a single writer task.
+
+  Each write is a function of a session. Writes queued while a transaction
+  is committing are applied together in the next one, each in its own
+  savepoint, so a failing write only rolls back itself. Without a running
+  writer task, writes are committed directly.
+  """
+  max_batch_size: int = 100
+
+  def __init__(
+      self,
+      session_factory: async_sessionmaker[AsyncSession] = SessionLocal) -> None:
+    self._session_factory = session_factory
+    self._queue: asyncio.Queue[tuple[WriteFn, asyncio.Future]] | None = None
+
+  async def submit(self, write: Callable[[AsyncSession], Awaitable[T]]) -> T:
+    if self._queue is None:
+      async with self._session_factory() as db:
+        result = await write(db)
+        await db.commit()
+        return result
+    future = asyncio.get_running_loop().create_future()
+    self._queue.put_nowait((write, future))
+    return await future
+
+  async def run(self) -> None:
+    self._queue = queue = asyncio.Queue()
+    try:
+      while True:
+        batch = [await queue.get()]
+        while not queue.empty() and len(batch) < self.max_batch_size:
+          batch.append(queue.get_nowait())
+        await self._commit(batch)
+    finally:
+      self._queue = None
+      remaining = []
+      while not queue.empty():
+        remaining.append(queue.get_nowait())
+      if remaining:
+        await self._commit(remaining)
+
+  async def _commit(self, batch: list[tuple[WriteFn, asyncio.Future]]) -> None:
+    results: list[tuple[asyncio.Future, Any, BaseException | None]] = []
+    try:
+      async with self._session_factory() as db:
+        for write, future in batch:
+          try:
+            async with db.begin_nested():
+              results.append((future, await write(db), None))
+          except Exception as e:
+            results.append((future, None, e))
+        await db.commit()
+    except Exception as e:
+      logger.exception(f"Failed to commit a batch of {len(batch)} writes.")
+      for _, future in batch:
+        if not future.done():
+          future.set_exception(e)
+      return
+    for future, result, error in results:
+      if future.done():
+        continue
+      if error is not None:
+        future.set_exception(error)
+      else:
+        future.set_result(result)
+
+write_queue = WriteQueue()
@@ -1,28 +1,63 @@
+from datetime import date as datetime_date, timedelta
 from enum import Enum
-from functools import partial
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query
+from sqlalchemy import select
 from psyche.models.calendar_models import Activity
 from psyche.schemas.calendar_schemas import (
-    ActivityRead, ActivityCreate, ActivityUpdate, CalendarGenerationRequest)
+    ActivityDay, ActivityRead, ActivityCreate, ActivityUpdate,
+    CalendarGenerationRequest)
 from psyche.schemas.job_schemas import JobRead
 from psyche.services.calendar import generate_calendar
-from psyche.fastapi_deps import JobManagerDep, SessionDep
+from psyche.fastapi_deps import JobManagerDep, ReadSessionDep, SessionDep
 from psyche.crud import add_crud_routes
+from psyche.responses import FastJSONResponse
+from psyche.table_versions import CacheHeaders, conditional_get
 
 router = APIRouter(prefix="/calendar")
 
 calendar_tags: list[str | Enum] = ["Calendar"]
 
+MAX_RANGE_DAYS = 366
+
 @router.post(":generate", response_model=JobRead, tags=calendar_tags)
 async def generate(
     body: CalendarGenerationRequest,
     job_manager: JobManagerDep,
-    date: str = Query(
-        ...,
-        description=
-        "Date in ISO format (YYYY-MM-DD)")):
-  coro = partial(generate_calendar, date=date, request=body)
-  return job_manager.submit_job(coro)
+    date: datetime_date = Query(
+        ..., description="Date in ISO format (YYYY-MM-DD)")):
+  return await job_manager.submit_job(
+      generate_calendar, date=date, request=body)
+
+@router.get("/days", response_model=list[ActivityDay], tags=calendar_tags)
+async def get_days(
+    db: ReadSessionDep,
+    from_: datetime_date = Query(alias="from"),
+    to: datetime_date = Query(),
+    completed: bool | None = None,
+    cache_headers: CacheHeaders = conditional_get(Activity.__tablename__)):
+  """Returns the activities of every day from `from` to `to`, inclusive."""
+  days = (to - from_).days + 1
+  if not 0 < days <= MAX_RANGE_DAYS:
+    raise HTTPException(
+        status_code=422,
+        detail=f"The range must span 1 to {MAX_RANGE_DAYS} days")
+
+  stmt = select(
+      *(getattr(Activity, field) for field in ActivityRead.model_fields)).where(
+          Activity.date.between(from_, to))
+  if completed is not None:
+    stmt = stmt.where(Activity.completed == completed)
+  res = await db.execute(stmt.order_by(Activity.date, Activity.id))
+
+  activities_by_day = {from_ + timedelta(days=i): [] for i in range(days)}
+  for row in res.mappings():
+    activities_by_day[row["date"]].append(dict(row))
+  return FastJSONResponse(
+      [
+          dict(date=day, activities=activities)
+          for day, activities in activities_by_day.items()
+      ],
+      headers=cache_headers)
 
 add_crud_routes(
     router=router,
@@ -31,7 +66,9 @@ add_crud_routes(
     prefix="/activities",
     tags=calendar_tags,
     methods=["read_all"],
-    query_param_to_field={"date": "date"})
+    query_param_to_field={"date": "date"},
+    order_by=["date", "id"],
+    projection=True)
 
 add_crud_routes(
     router=router,
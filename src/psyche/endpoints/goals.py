@@ -1,15 +1,16 @@
 from enum import Enum
-from functools import partial
 from fastapi import APIRouter, HTTPException
 from sqlalchemy import select
 from psyche.models.goal_models import Goal, GoalStrategy
 from psyche.schemas.goal_schemas import (
     GoalCreate, GoalRead, GoalUpdate, StrategyGenerationRequest,
-    GoalStrategyRead, GoalMetadata)
+    BulkStrategyGenerationRequest, GoalStrategyRead, GoalMetadata)
 from psyche.schemas.job_schemas import JobRead
 from psyche.crud import add_crud_routes
-from psyche.fastapi_deps import JobManagerDep, SessionDep
-from psyche.services.strategy import generate_strategy
+from psyche.responses import FastJSONResponse
+from psyche.table_versions import CacheHeaders, conditional_get
+from psyche.fastapi_deps import JobManagerDep, ReadSessionDep
+from psyche.services.strategy import generate_strategy, generate_strategies
 
 router = APIRouter(prefix="/goals")
 
@@ -18,24 +19,36 @@ goals_tags: list[str | Enum] = ["Goals"]
 @router.post("/{id}/strategy:generate", response_model=JobRead, tags=goals_tags)
 async def generate(
     id: int, body: StrategyGenerationRequest, job_manager: JobManagerDep):
-  coro = partial(generate_strategy, id=id, request=body)
-  return job_manager.submit_job(coro)
+  return await job_manager.submit_job(generate_strategy, id=id, request=body)
 
-@router.get("/{id}/strategy", response_model=GoalStrategyRead, tags=goals_tags)
-async def get_strategy(id: int, db: SessionDep):
+@router.post("/strategy:generate", response_model=JobRead, tags=goals_tags)
+async def generate_bulk(
+    body: BulkStrategyGenerationRequest, job_manager: JobManagerDep):
+  return await job_manager.submit_job(generate_strategies, request=body)
+
+@router.get(
+    "/{id}/strategy",
+    response_model=GoalStrategyRead,
+    tags=goals_tags,
+    dependencies=[conditional_get(GoalStrategy.__tablename__)])
+async def get_strategy(id: int, db: ReadSessionDep):
   item = await db.scalar(select(GoalStrategy).where(GoalStrategy.goal_id == id))
   if not item:
     raise HTTPException(status_code=404, detail="Item not found")
   return item
 
 @router.get("/metadata", response_model=list[GoalMetadata], tags=goals_tags)
-async def get_metadata(db: SessionDep):
+async def get_metadata(
+    db: ReadSessionDep,
+    cache_headers: CacheHeaders = conditional_get(
+        Goal.__tablename__, GoalStrategy.__tablename__)):
   stmt = select(
       Goal.id.label("goal_id"),
       GoalStrategy.id.is_not(None).label("has_strategy")).outerjoin(
           GoalStrategy, Goal.id == GoalStrategy.goal_id)
   res = await db.execute(stmt)
-  return res.mappings().all()
+  return FastJSONResponse(
+      [dict(row) for row in res.mappings()], headers=cache_headers)
 
 add_crud_routes(
     router=router,
@@ -43,4 +56,5 @@ add_crud_routes(
     read_schema=GoalRead,
     create_schema=GoalCreate,
     update_schema=GoalUpdate,
-    tags=goals_tags)
+    tags=goals_tags,
+    projection=True)
@@ -1,6 +1,10 @@
+import json
+from collections.abc import AsyncIterator
 from enum import Enum
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from psyche.fastapi_deps import JobManagerDep
+from psyche.responses import FastJSONResponse
 from psyche.schemas.job_schemas import JobRead, JobBatchRequest
 
 router = APIRouter(prefix="/jobs")
@@ -8,16 +12,67 @@ router = APIRouter(prefix="/jobs")
 jobs_tags: list[str | Enum] = ["Jobs"]
 
 @router.get("", response_model=list[JobRead], tags=jobs_tags)
-async def get_jobs(job_manager: JobManagerDep):
-  return job_manager.get_jobs()
+async def get_jobs(
+    job_manager: JobManagerDep,
+    limit: int | None = Query(None, ge=1, le=10000),
+    before_id: int | None = None):
+  jobs = await job_manager.get_jobs(limit=limit, before_id=before_id)
+  return FastJSONResponse(jobs)
 
 @router.post("/batch", response_model=list[JobRead], tags=jobs_tags)
 async def get_job_batch(payload: JobBatchRequest, job_manager: JobManagerDep):
-  return job_manager.get_jobs_by_ids(payload.job_ids)
+  return FastJSONResponse(await job_manager.get_jobs_by_ids(payload.job_ids))
+
+@router.get("/events", tags=jobs_tags)
+async def watch_jobs(job_manager: JobManagerDep, job_ids: list[int] = Query()):
+  """Pushes status changes of the given jobs as server-sent events.
+
+  The current state of each job is sent first; the stream ends once every
+  watched job has finished.
+  """
+
+  async def events():
+    async for job in job_manager.watch_jobs(job_ids):
+      yield _sse("status", job.model_dump_json())
+
+  return _event_stream(events())
 
 @router.get("/{job_id}", response_model=JobRead, tags=jobs_tags)
 async def get_job(job_id: int, job_manager: JobManagerDep):
-  job = job_manager.get_job(job_id)
+  job = await job_manager.get_job(job_id)
   if job is None:
     raise HTTPException(status_code=404, detail="Job not found")
   return job
+
+@router.get("/{job_id}/output", tags=jobs_tags)
+async def stream_job_output(job_id: int, job_manager: JobManagerDep):
+  """Streams a job's partial output as server-sent events.
+
+  Each chunk is sent as an `output` event; a final `status` event carries the
+  job once it has finished. Output is only available from the process running
+  the job; elsewhere only the final status is sent.
+  """
+  if await job_manager.get_job(job_id) is None:
+    raise HTTPException(status_code=404, detail="Job not found")
+  output = job_manager.get_job_output(job_id)
+
+  async def events():
+    if output is not None:
+      async for chunk in output.follow():
+        yield _sse("output", json.dumps(chunk))
+    job = None
+    async for job in job_manager.watch_jobs([job_id]):
+      pass
+    if job is not None:
+      yield _sse("status", job.model_dump_json())
+
+  return _event_stream(events())
+
+def _event_stream(events: AsyncIterator[str]) -> StreamingResponse:
+  return StreamingResponse(
+      events,
+      media_type="text/event-stream",
+      headers={"Cache-Control": "no-cache"})
+
+def _sse(event: str, data: str) -> str:
+  return f"event: {event}\ndata: {data}\n\n"
@@ -0,0 +1,55 @@
+from dataclasses import asdict
+from enum import Enum
+from typing import Any
+from fastapi import APIRouter, Query
+from fastapi.responses import PlainTextResponse
+from psyche.provider_health import circuit_breakers, model_health
+from psyche.responses import FastJSONResponse
+from psyche.telemetry import LlmCall, recent_llm_calls, registry
+
+router = APIRouter(prefix="/metrics")
+
+metrics_tags: list[str | Enum] = ["Metrics"]
+
+@router.get("", response_class=PlainTextResponse, tags=metrics_tags)
+async def get_metrics():
+  """Returns the metrics of this process in the Prometheus text format."""
+  return PlainTextResponse(
+      registry.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/llm-calls", tags=metrics_tags)
+async def get_llm_calls(limit: int = Query(100, ge=1, le=1000)):
+  """Returns the latest LLM calls of this process, newest first."""
+  calls = list(recent_llm_calls)[-limit:]
+  calls.reverse()
+  return FastJSONResponse([_call_dict(call) for call in calls])
+
+@router.get("/routing", tags=metrics_tags)
+async def get_routing():
+  """Returns the circuit states and the health of the models this process
+  has called."""
+  return FastJSONResponse(
+      dict(
+          providers=[
+              dict(
+                  provider_id=pid,
+                  state=breaker.state,
+                  consecutive_failures=breaker.failures)
+              for pid, breaker in circuit_breakers.items()
+          ],
+          models=[
+              dict(
+                  provider_id=pid,
+                  model=model,
+                  requests=health.requests,
+                  latency=health.latency,
+                  p95=health.percentile(0.95),
+                  error_rate=health.error_rate)
+              for (pid, model), health in model_health.items()
+          ]))
+
+def _call_dict(call: LlmCall) -> dict[str, Any]:
+  return {
+      name: value
+      for name, value in asdict(call).items() if not name.startswith("_")
+  }
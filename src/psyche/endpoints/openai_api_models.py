@@ -1,5 +1,4 @@
 from fastapi import APIRouter
-from sqlalchemy import select
 from psyche.models.openai_api_models import OpenAiApiModel
 from psyche.schemas.openai_api_schemas import (
     OpenAiApiModelCreate,
@@ -7,7 +6,6 @@ from psyche.schemas.openai_api_schemas import (
     OpenAiApiModelUpdate,
 )
 from psyche.crud import add_crud_routes
-from psyche.fastapi_deps import SessionDep
 
 router = APIRouter(prefix="/openai-api-models")
 
@@ -18,4 +16,5 @@ add_crud_routes(
     update_schema=OpenAiApiModelUpdate,
     tags=["OpenAI API Models"],
     methods=["read_all", "update"],
+    projection=True,
 )
@@ -1,7 +1,7 @@
 from enum import Enum
 from fastapi import APIRouter
-from sqlalchemy import select, delete
-from psyche.fastapi_deps import SessionDep, OpenAiDep
+from sqlalchemy import select
+from psyche.fastapi_deps import JobManagerDep, ReadSessionDep
 from psyche.models.openai_api_models import OpenAiApiProvider, OpenAiApiKey, OpenAiApiModel
 from psyche.schemas.openai_api_schemas import (
     OpenAiApiProviderCreate,
@@ -9,7 +9,11 @@ from psyche.schemas.openai_api_schemas import (
     OpenAiApiProviderUpdate,
     OpenAiApiKeyCreate,
     OpenAiApiModelRead,
+    ModelRefreshRequest,
 )
+from psyche.schemas.job_schemas import JobRead
+from psyche.services.model_catalog import (
+    fetch_catalog, refresh_model_catalogs, sync_catalogs)
 from psyche.crud import add_crud_routes
 
 router = APIRouter(prefix="/openai-api-providers")
@@ -20,31 +24,19 @@ openai_api_models_tags: list[str | Enum] = ["OpenAI API Models"]
     "/{pid}/models/refresh",
     response_model=list[OpenAiApiModelRead],
     tags=openai_api_models_tags)
-async def refresh_models(pid: int, db: SessionDep, client: OpenAiDep):
-
-  remote_model_list = await client.models.list()
-  remote_model_names = {model.id for model in remote_model_list.data}
-  result = await db.scalars(
-      select(OpenAiApiModel.name).where(OpenAiApiModel.provider_id == pid))
-  db_model_names = set(result)
-
-  new_names = remote_model_names - db_model_names
-  dropped_names = db_model_names - remote_model_names
-
-  if new_names:
-    db.add_all(
-        [OpenAiApiModel(provider_id=pid, name=name) for name in new_names])
-  if dropped_names:
-    await db.execute(
-        delete(OpenAiApiModel).where(
-            OpenAiApiModel.provider_id == pid,
-            OpenAiApiModel.name.in_(dropped_names)))
-  await db.commit()
-
+async def refresh_models(pid: int, db: ReadSessionDep):
+  await sync_catalogs({pid: await fetch_catalog(pid)})
   result = await db.scalars(
       select(OpenAiApiModel).where(OpenAiApiModel.provider_id == pid))
   return result.all()
 
+@router.post(
+    "/models:refresh", response_model=JobRead, tags=openai_api_models_tags)
+async def refresh_all_models(
+    job_manager: JobManagerDep, body: ModelRefreshRequest | None = None):
+  return await job_manager.submit_job(
+      refresh_model_catalogs, request=body or ModelRefreshRequest())
+
 add_crud_routes(
     router=router,
     model=OpenAiApiProvider,
@@ -1,2 +1,5 @@
 class ResourceNotFoundError(Exception):
   pass
+
+class ProviderUnavailableError(Exception):
+  pass
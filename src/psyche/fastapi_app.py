@@ -1,28 +1,45 @@
+import asyncio
 import logging
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from psyche.endpoints.goals import router as goals_router
 from psyche.endpoints.openai_api_providers import router as openai_api_providers_router
 from psyche.endpoints.openai_api_keys import router as openai_api_keys_router
 from psyche.endpoints.openai_api_models import router as openai_api_models_router
 from psyche.endpoints.calendar import router as calendar_router
 from psyche.endpoints.jobs import router as jobs_router
+from psyche.endpoints.metrics import router as metrics_router
 from psyche.exceptions import ResourceNotFoundError
+from psyche.job_manager import get_job_manager
+from psyche.log_config import start_logging
+from psyche.profiling import PROFILING, ProfilingMiddleware
 
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+  job_manager = get_job_manager()
+  if job_manager.role != "api":
+    yield
+    return
+  # API worker of a multi-process deployment: jobs run in executor processes,
+  # only the store writer runs here.
+  start_logging()
+  task = asyncio.create_task(job_manager.run())
   yield
+  task.cancel()
+  with suppress(asyncio.CancelledError):
+    await task
 
 app = FastAPI(lifespan=lifespan)
 
 @app.exception_handler(ResourceNotFoundError)
 async def resource_not_found_handler(
     request: Request, exc: ResourceNotFoundError):
-  logger.debug(f"Resource not found handler triggered")
+  logger.debug("Resource not found handler triggered")
   return JSONResponse(status_code=404, content={"detail": "Resource not found"})
 
 origins = [
@@ -34,7 +51,11 @@ app.add_middleware(
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"])
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Server-Timing"])
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+if PROFILING:
+  app.add_middleware(ProfilingMiddleware)
 
 app.include_router(goals_router)
 app.include_router(openai_api_providers_router)
@@ -42,3 +63,4 @@ app.include_router(openai_api_keys_router)
 app.include_router(openai_api_models_router)
 app.include_router(calendar_router)
 app.include_router(jobs_router)
+app.include_router(metrics_router)
@@ -1,11 +1,9 @@
 from typing import Annotated
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends
-from openai import AsyncOpenAI
-from psyche.database import get_db
-from psyche.openai_clients import get_openai_client
+from psyche.database import get_db, get_read_db
 from psyche.job_manager import get_job_manager, JobManager
 
 SessionDep = Annotated[AsyncSession, Depends(get_db)]
-OpenAiDep = Annotated[AsyncOpenAI, Depends(get_openai_client)]
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_db)]
 JobManagerDep = Annotated[JobManager, Depends(get_job_manager)]
\ No newline at end of file
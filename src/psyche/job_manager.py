@@ -1,89 +1,444 @@
 import logging
 import asyncio
+import os
+import socket
+import time
+import uuid
 from contextvars import ContextVar
-from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from collections.abc import AsyncIterator, Iterable
 from collections import deque
-from typing import Any
-from psyche.schemas.job_schemas import JobRead
+from typing import Any, Literal
+from psyche.database import SQLITE_TUNED, write_queue
+from psyche.models.job_models import Job
+from psyche.schemas.job_schemas import JobRead, JobStatus
+from psyche.job_store import (
+    JobHandler, JobStore, dedupe_key, handler_name, load_params,
+    resolve_handler)
+from psyche.telemetry import record_job
 
 logger = logging.getLogger(__name__)
 
 current_job_id: ContextVar[int] = ContextVar("current_job_id")
 
+FINISHED_JOB_STATUSES: tuple[JobStatus, ...] = ("done", "error")
+
+# "all" runs submitted jobs in-process. In a multi-process deployment, "api"
+# workers only persist jobs and "executor" processes lease them from the store.
+JobRole = Literal["all", "api", "executor"]
+# A periodic submission: handler, interval in seconds and params
+JobSchedule = tuple[JobHandler, float, dict[str, Any]]
+
+class JobOutput:
+  """Partial output of a running job, replayable to late subscribers."""
+
+  def __init__(self) -> None:
+    self.chunks: list[str] = []
+    self.closed = False
+    self._changed = asyncio.Event()
+
+  def append(self, text: str) -> None:
+    self.chunks.append(text)
+    self._notify()
+
+  def close(self) -> None:
+    self.closed = True
+    self._notify()
+
+  def _notify(self) -> None:
+    self._changed.set()
+    self._changed = asyncio.Event()
+
+  async def follow(self) -> AsyncIterator[str]:
+    i = 0
+    while True:
+      changed = self._changed
+      while i < len(self.chunks):
+        yield self.chunks[i]
+        i += 1
+      if self.closed:
+        return
+      await changed.wait()
+
 class JobManager:
   history_size: int = 1000
   job_queue_size: int = 100
-  max_concurrent_jobs: int = 10
+  # LLM load is bounded per provider by the rate limiters, so this only
+  # guards local resources.
+  max_concurrent_jobs: int = int(os.getenv("PSYCHE_MAX_CONCURRENT_JOBS", "50"))
+  lease_seconds: float = 30.0
+  claim_interval: float = 0.25
+  status_poll_interval: float = 0.25
 
-  def __init__(self) -> None:
+  def __init__(
+      self, role: JobRole = "all", store: JobStore | None = None) -> None:
 
-    self._num_jobs = 0
+    self.role = role
+    self.worker_id = (
+        f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}")
+    self._store = store or JobStore()
 
     # Jobs submitted but not yet started
     self._job_queue = asyncio.Queue(maxsize=self.job_queue_size)
 
-    # Job history
+    # Recent job history; older jobs are served from the store
     self._job_ids_deque = deque(maxlen=self.history_size)
     self._job_read_dict: dict[int, JobRead] = {}
 
+    # Output streams of jobs that have not finished yet
+    self._job_outputs: dict[int, JobOutput] = {}
+
+    # Status subscribers, per job id
+    self._job_watchers: dict[int, set[asyncio.Queue[JobRead]]] = {}
+
+    # Jobs started by this process that have not finished yet
+    self._running_ids: set[int] = set()
+
+    # Single-flight submissions: dedupe key -> job serving it, and back
+    self._coalesced: dict[str, asyncio.Future[JobRead]] = {}
+    self._dedupe_keys: dict[int, str] = {}
+
+    # Handler name -> how long a successful job keeps answering duplicate
+    # submissions. Only for handlers whose result depends on nothing but their
+    # params; jobs of other handlers are only shared while unfinished.
+    self.completed_reuse_seconds: dict[str, float] = {}
+
     self._semaphore = asyncio.Semaphore(self.max_concurrent_jobs)
 
+    # Periodic submissions, started by run()
+    self._schedules: list[JobSchedule] = []
+
   async def _job_execution_context(
-      self, job_coro: Callable[[], Awaitable[Any]], job_read: JobRead) -> None:
+      self, handler: JobHandler, params: dict[str, Any], job_read: JobRead,
+      queued_at: datetime) -> None:
     async with self._semaphore:
+      queue_wait = (datetime.now(timezone.utc) - queued_at).total_seconds()
+      started = time.perf_counter()
       token = current_job_id.set(job_read.id)
+      self._set_status(job_read, "running")
       try:
-        await job_coro()
-        job_read.status = "done"
+        await handler(**params)
+        self._set_status(job_read, "done")
         logger.info(f"Job {job_read.id} completed successfully.")
       except Exception as e:
         logger.exception(f"Job {job_read.id} failed with exception: {e}")
-        job_read.status = "error"
-        job_read.info = str(e)
+        self._set_status(job_read, "error", info=str(e))
       finally:
         current_job_id.reset(token)
+        record_job(
+            handler_name(handler), job_read.status, queue_wait,
+            time.perf_counter() - started)
+        self._running_ids.discard(job_read.id)
+        self._finish_coalesced(handler, job_read)
+        output = self._job_outputs.pop(job_read.id, None)
+        if output is not None:
+          output.close()
+
+  def _set_status(
+      self,
+      job_read: JobRead,
+      status: JobStatus,
+      info: str | None = None) -> None:
+    job_read.status = status
+    if info is not None:
+      job_read.info = info
+    self._publish(job_read)
+
+  def _publish(self, job_read: JobRead) -> None:
+    self._store.record_status(job_read)
+    for queue in self._job_watchers.get(job_read.id, ()):
+      queue.put_nowait(job_read.model_copy())
+
+  def _remember(self, job_read: JobRead) -> None:
+    if len(self._job_ids_deque) == self._job_ids_deque.maxlen:
+      oldest_job_id = self._job_ids_deque[0]
+      self._job_read_dict.pop(oldest_job_id)
+
+    self._job_ids_deque.append(job_read.id)
+    self._job_read_dict[job_read.id] = job_read
+
+  def _start_job(
+      self, tg: asyncio.TaskGroup, handler: JobHandler, params: dict[str, Any],
+      job_read: JobRead, queued_at: datetime) -> None:
+    self._running_ids.add(job_read.id)
+    tg.create_task(
+        self._job_execution_context(handler, params, job_read, queued_at))
+
+  def _start_stored_job(self, tg: asyncio.TaskGroup, job: Job) -> None:
+    job_read = JobRead(id=job.id, status="pending")
+    self._remember(job_read)
+    try:
+      handler = resolve_handler(job.handler)
+      params = load_params(handler, job.params)
+    except Exception as e:
+      logger.exception(f"Job {job.id} could not be loaded: {e}")
+      self._set_status(job_read, "error", info=str(e))
+      return
+    # SQLite timestamps are naive UTC
+    queued_at = job.created_at.replace(tzinfo=timezone.utc)
+    self._start_job(tg, handler, params, job_read, queued_at)
+
+  async def _recover_jobs(self, tg: asyncio.TaskGroup) -> None:
+    """Re-enqueues jobs left pending or running by a previous process."""
+    for job in await self._store.load_unfinished():
+      logger.info("Recovering job %s (%s).", job.id, job.handler)
+      self._start_stored_job(tg, job)
+
+  async def _claim_jobs(self, tg: asyncio.TaskGroup) -> None:
+    while True:
+      capacity = self.max_concurrent_jobs - len(self._running_ids)
+      jobs = []
+      if capacity > 0:
+        jobs = await self._store.claim(
+            self.worker_id, capacity, self.lease_seconds)
+      for job in jobs:
+        self._start_stored_job(tg, job)
+      if not jobs:
+        await asyncio.sleep(self.claim_interval)
+
+  async def _renew_leases(self) -> None:
+    while True:
+      await asyncio.sleep(self.lease_seconds / 3)
+      try:
+        await self._store.renew_leases(
+            self.worker_id, list(self._running_ids), self.lease_seconds)
+      except Exception as e:
+        logger.exception(f"Failed to renew job leases: {e}")
+
+  def schedule(
+      self, handler: JobHandler, interval: float, **params: Any) -> None:
+    """Submits a job every `interval` seconds once the manager runs.
+
+    Schedules only run in processes that execute jobs. Each process keeps its
+    own timer, so a schedule must be registered in a single process of the
+    deployment.
+    """
+    self._schedules.append((handler, interval, params))
+
+  async def _run_schedule(self, schedule: JobSchedule) -> None:
+    handler, interval, params = schedule
+    while True:
+      await asyncio.sleep(interval)
+      try:
+        await self.submit_job(handler, **params)
+      except Exception as e:
+        logger.exception(
+            f"Failed to submit scheduled job {handler_name(handler)}: {e}")
 
   async def run(self) -> None:
     async with asyncio.TaskGroup() as tg:
-      while True:
-        job_coro, job_read = await self._job_queue.get()
-        tg.create_task(self._job_execution_context(job_coro, job_read))
+      if SQLITE_TUNED:
+        tg.create_task(write_queue.run())
+      tg.create_task(self._store.run())
+      if self.role != "api":
+        for schedule in self._schedules:
+          tg.create_task(self._run_schedule(schedule))
+      if self.role == "executor":
+        tg.create_task(self._renew_leases())
+        await self._claim_jobs(tg)
+      elif self.role == "all":
+        await self._recover_jobs(tg)
+        while True:
+          handler, params, job_read, queued_at = await self._job_queue.get()
+          self._start_job(tg, handler, params, job_read, queued_at)
 
-  def submit_job(self, job_coro: Callable[[], Awaitable[Any]]) -> JobRead:
-    self._num_jobs += 1
-    job_id = self._num_jobs
-    job_read = JobRead(id=job_id, status="pending")
+  async def submit_job(self, handler: JobHandler, **params: Any) -> JobRead:
+    """Persists and enqueues a job.
+
+    `handler` must be a module-level coroutine function and `params` must be
+    serializable, so that unfinished jobs can be resumed after a restart.
+
+    Submissions are single-flight: while a job with the same handler and
+    params is pending or running, that job is returned instead of starting
+    another one. Handlers listed in `completed_reuse_seconds` also share jobs
+    that have just succeeded.
+    """
+    key = dedupe_key(handler, params)
+    existing = self._coalesced.get(key)
+    if existing is not None:
+      try:
+        job_read = await asyncio.shield(existing)
+      except Exception:
+        pass
+      else:
+        if job_read.status != "error":
+          return job_read
 
+    future: asyncio.Future[JobRead] = asyncio.get_running_loop().create_future()
+    self._coalesced[key] = future
     try:
-      self._job_queue.put_nowait((job_coro, job_read))
+      job_read = await self._submit_job(handler, params, key)
+    except BaseException as e:
+      self._release_coalesced(key, future)
+      future.set_exception(e)
+      # Only surfaced through the submitter
+      future.exception()
+      raise
+    future.set_result(job_read)
+    if job_read.id not in self._dedupe_keys:
+      # Not run by this process; the store answers later duplicates
+      self._release_coalesced(key, future)
+    return job_read
 
-      if len(self._job_ids_deque) == self._job_ids_deque.maxlen:
-        oldest_job_id = self._job_ids_deque[0]
-        self._job_read_dict.pop(oldest_job_id)
+  async def _submit_job(
+      self, handler: JobHandler, params: dict[str, Any], key: str) -> JobRead:
+    done_after = None
+    reuse_seconds = self._reuse_seconds(handler)
+    if reuse_seconds > 0:
+      done_after = datetime.now(timezone.utc) - timedelta(seconds=reuse_seconds)
+    duplicate = await self._store.find_duplicate(key, done_after)
+    if duplicate is not None:
+      return self._job_read_dict.get(duplicate.id, duplicate)
 
-      self._job_ids_deque.append(job_read.id)
-      self._job_read_dict[job_read.id] = job_read
+    job_id = await self._store.insert(handler, params, dedupe_key=key)
+    job_read = JobRead(id=job_id, status="pending")
+    if self.role != "all":
+      # Picked up by an executor process through the store
+      return job_read
+    self._remember(job_read)
 
+    try:
+      self._job_queue.put_nowait(
+          (handler, params, job_read, datetime.now(timezone.utc)))
+      self._dedupe_keys[job_read.id] = key
     except asyncio.QueueFull:
-      job_read.status = "error"
-      job_read.info = "Job queue is full."
+      self._set_status(job_read, "error", info="Job queue is full.")
 
     return job_read
 
-  def get_job(self, job_id: int) -> JobRead | None:
-    return self._job_read_dict.get(job_id)
+  def _reuse_seconds(self, handler: JobHandler) -> float:
+    return self.completed_reuse_seconds.get(handler_name(handler), 0.0)
 
-  def get_jobs(self) -> list[JobRead]:
-    return list(self._job_read_dict.values())
+  def _finish_coalesced(self, handler: JobHandler, job_read: JobRead) -> None:
+    key = self._dedupe_keys.pop(job_read.id, None)
+    future = self._coalesced.get(key) if key is not None else None
+    if future is None:
+      return
+    reuse_seconds = self._reuse_seconds(handler)
+    if job_read.status == "done" and reuse_seconds > 0:
+      asyncio.get_running_loop().call_later(
+          reuse_seconds, self._release_coalesced, key, future)
+    else:
+      self._release_coalesced(key, future)
 
-  def get_jobs_by_ids(self, ids) -> list[JobRead]:
-    return [self._job_read_dict[i] for i in ids if i in self._job_read_dict]
+  def _release_coalesced(
+      self, key: str, future: asyncio.Future[JobRead]) -> None:
+    if self._coalesced.get(key) is future:
+      del self._coalesced[key]
+
+  async def get_job(self, job_id: int) -> JobRead | None:
+    job_read = self._job_read_dict.get(job_id)
+    if job_read is None:
+      job_read = await self._store.get(job_id)
+    return job_read
+
+  async def get_jobs(
+      self,
+      limit: int | None = None,
+      before_id: int | None = None) -> list[JobRead]:
+    stored = await self._store.get_latest(
+        limit or self.history_size, before_id=before_id)
+    return [self._job_read_dict.get(job.id, job) for job in stored]
+
+  async def get_jobs_by_ids(self, ids) -> list[JobRead]:
+    found = {i: self._job_read_dict[i] for i in ids if i in self._job_read_dict}
+    missing = [i for i in ids if i not in found]
+    for job_read in await self._store.get_many(missing):
+      found[job_read.id] = job_read
+    return [found[i] for i in ids if i in found]
 
   def update_job(self, job_read: JobRead) -> None:
     if job_read.id in self._job_read_dict:
       self._job_read_dict[job_read.id] = job_read
+      self._store.record_status(job_read)
+
+  def report_progress(self, progress: dict[int, JobStatus]) -> None:
+    """Publishes per-item progress of the job running in the current
+    context."""
+    job_read = self._job_read_dict.get(current_job_id.get(None))
+    if job_read is None:
+      return
+    job_read.progress = dict(progress)
+    self._publish(job_read)
+
+  def current_output(self) -> JobOutput | None:
+    """Returns the output stream of the job running in the current context."""
+    job_id = current_job_id.get(None)
+    if job_id is None:
+      return None
+    output = self._job_outputs.get(job_id)
+    if output is None:
+      output = self._job_outputs[job_id] = JobOutput()
+    return output
+
+  def emit_output(self, text: str) -> None:
+    """Publishes partial output for the job running in the current context."""
+    output = self.current_output()
+    if output is not None:
+      output.append(text)
+
+  def get_job_output(self, job_id: int) -> JobOutput | None:
+    """Returns the output stream of an unfinished job, creating it if needed."""
+    output = self._job_outputs.get(job_id)
+    job_read = self._job_read_dict.get(job_id)
+    finished = job_read is None or job_read.status in FINISHED_JOB_STATUSES
+    if output is None and not finished:
+      output = self._job_outputs[job_id] = JobOutput()
+    return output
+
+  async def watch_jobs(self, ids: Iterable[int]) -> AsyncIterator[JobRead]:
+    """Yields the current state of each known job, then every status change
+    until all of them have finished.
+
+    Jobs run by this process are pushed as they change. Others, i.e. older
+    jobs or jobs run by an executor process, are polled from the store.
+    """
+    ids = list(dict.fromkeys(ids))
+    queue: asyncio.Queue[JobRead] = asyncio.Queue()
+    watched = [i for i in ids if i in self._job_read_dict]
+    for job_id in watched:
+      self._job_watchers.setdefault(job_id, set()).add(queue)
+    try:
+      polled: dict[int, JobRead] = {}
+      others = [i for i in ids if i not in self._job_read_dict]
+      for job_read in await self._store.get_many(others):
+        if job_read.status not in FINISHED_JOB_STATUSES:
+          polled[job_read.id] = job_read
+        yield job_read
+      unfinished: set[int] = set()
+      for job_id in watched:
+        job_read = self._job_read_dict[job_id].model_copy()
+        if job_read.status not in FINISHED_JOB_STATUSES:
+          unfinished.add(job_id)
+        yield job_read
+      while unfinished or polled:
+        timeout = self.status_poll_interval if polled else None
+        try:
+          job_read = await asyncio.wait_for(queue.get(), timeout)
+        except TimeoutError:
+          pass
+        else:
+          if job_read.status in FINISHED_JOB_STATUSES:
+            unfinished.discard(job_read.id)
+          yield job_read
+          continue
+        for job_read in await self._store.get_many(list(polled)):
+          if job_read == polled[job_read.id]:
+            continue
+          if job_read.status in FINISHED_JOB_STATUSES:
+            del polled[job_read.id]
+          else:
+            polled[job_read.id] = job_read
+          yield job_read
+    finally:
+      for job_id in watched:
+        watchers = self._job_watchers.get(job_id)
+        if watchers is not None:
+          watchers.discard(queue)
+          if not watchers:
+            del self._job_watchers[job_id]
 
-job_manager = JobManager()
+job_manager = JobManager(role=os.getenv("PSYCHE_JOB_ROLE", "all"))
 
 def get_job_manager():
   return job_manager
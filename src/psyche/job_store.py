@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import importlib
+import inspect
+import json
+import logging
+import typing
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from pydantic import TypeAdapter
+from pydantic_core import to_jsonable_python
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from psyche.database import ReadSessionLocal, SessionLocal
+from psyche.models.job_models import Job
+from psyche.schemas.job_schemas import JobRead
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[..., Awaitable[Any]]
+
+def handler_name(handler: JobHandler) -> str:
+  return f"{handler.__module__}:{handler.__qualname__}"
+
+def resolve_handler(name: str) -> JobHandler:
+  module_name, _, qualname = name.partition(":")
+  obj: Any = importlib.import_module(module_name)
+  for attr in qualname.split("."):
+    obj = getattr(obj, attr)
+  return obj
+
+def dump_params(params: dict[str, Any]) -> dict[str, Any]:
+  return to_jsonable_python(params)
+
+def dedupe_key(handler: JobHandler, params: dict[str, Any]) -> str:
+  payload = json.dumps(
+      [handler_name(handler), dump_params(params)], sort_keys=True)
+  return hashlib.sha256(payload.encode()).hexdigest()
+
+def load_params(handler: JobHandler, params: dict[str, Any]) -> dict[str, Any]:
+  """Rebuilds typed handler arguments from their stored JSON form."""
+  hints = typing.get_type_hints(handler)
+  signature = inspect.signature(handler)
+  loaded = {}
+  for name, value in params.items():
+    annotation = hints.get(name, signature.parameters[name].annotation)
+    if annotation is inspect.Parameter.empty:
+      loaded[name] = value
+    else:
+      loaded[name] = TypeAdapter(annotation).validate_python(value)
+  return loaded
+
+def _to_job_read(job: Job) -> JobRead:
+  return JobRead(
+      id=job.id, status=job.status, info=job.info, progress=job.progress)
+
+class JobStore:
+  """Persists jobs to the database.
+
+  Inserts are group-committed: concurrent submissions share one transaction
+  and wait for it. Status changes are fire-and-forget and coalesced per job,
+  so the job hot path never commits on its own.
+  """
+  flush_interval: float = 0.05
+
+  def __init__(
+      self,
+      session_factory: async_sessionmaker[AsyncSession] = SessionLocal,
+      read_session_factory: async_sessionmaker[AsyncSession] = ReadSessionLocal
+  ) -> None:
+    self._session_factory = session_factory
+    self._read_session_factory = read_session_factory
+    self._pending_inserts: list[tuple[Job, asyncio.Future[int]]] = []
+    self._pending_updates: dict[int, dict[str, Any]] = {}
+    self._wakeup = asyncio.Event()
+
+  async def insert(
+      self,
+      handler: JobHandler,
+      params: dict[str, Any],
+      dedupe_key: str | None = None) -> int:
+    job = Job(
+        handler=handler_name(handler),
+        params=dump_params(params),
+        status="pending",
+        dedupe_key=dedupe_key)
+    future: asyncio.Future[int] = asyncio.get_running_loop().create_future()
+    self._pending_inserts.append((job, future))
+    self._wakeup.set()
+    return await future
+
+  def record_status(self, job_read: JobRead) -> None:
+    self._pending_updates[job_read.id] = {
+        "id": job_read.id,
+        "status": job_read.status,
+        "info": job_read.info,
+        "progress": job_read.progress,
+        "updated_at": datetime.now(timezone.utc),
+    }
+    self._wakeup.set()
+
+  async def run(self) -> None:
+    try:
+      while True:
+        await self._wakeup.wait()
+        await asyncio.sleep(self.flush_interval)
+        self._wakeup.clear()
+        await self.flush()
+    except asyncio.CancelledError:
+      await self.flush()
+      raise
+
+  async def flush(self) -> None:
+    inserts, self._pending_inserts = self._pending_inserts, []
+    updates, self._pending_updates = self._pending_updates, {}
+    if not inserts and not updates:
+      return
+    try:
+      async with self._session_factory() as db:
+        if inserts:
+          db.add_all([job for job, _ in inserts])
+          await db.flush()
+        if updates:
+          await db.execute(update(Job), list(updates.values()))
+        await db.commit()
+    except Exception as e:
+      logger.exception(
+          f"Failed to persist {len(inserts)} job inserts "
+          f"and {len(updates)} status updates.")
+      for _, future in inserts:
+        if not future.done():
+          future.set_exception(e)
+      return
+    for job, future in inserts:
+      if not future.done():
+        future.set_result(job.id)
+
+  async def load_unfinished(self) -> list[Job]:
+    async with self._read_session_factory() as db:
+      result = await db.scalars(
+          select(Job).where(Job.status.in_(
+              ("pending", "running"))).order_by(Job.id))
+      return list(result.all())
+
+  async def find_duplicate(
+      self, dedupe_key: str, done_after: datetime | None) -> JobRead | None:
+    """Returns the latest unfinished job with the same key, or one that has
+    completed successfully after `done_after`."""
+    matches = Job.status.in_(("pending", "running"))
+    if done_after is not None:
+      matches = or_(
+          matches, and_(Job.status == "done", Job.updated_at >= done_after))
+    stmt = select(Job).where(Job.dedupe_key == dedupe_key,
+                             matches).order_by(Job.id.desc()).limit(1)
+    async with self._read_session_factory() as db:
+      job = await db.scalar(stmt)
+      return _to_job_read(job) if job is not None else None
+
+  async def claim(self, owner: str, limit: int,
+                  lease_seconds: float) -> list[Job]:
+    """Atomically leases up to `limit` runnable jobs to `owner`.
+
+    Runnable jobs are pending ones and running ones whose lease has expired,
+    i.e. whose executor died. SQLite serializes the update, so a job is only
+    ever claimed by one executor.
+    """
+    now = datetime.now(timezone.utc)
+    expired = or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now)
+    runnable = select(Job.id).where(
+        or_(Job.status == "pending",
+            and_(Job.status == "running",
+                 expired))).order_by(Job.id).limit(limit)
+    stmt = update(Job).where(Job.id.in_(runnable.scalar_subquery())).values(
+        status="running",
+        lease_owner=owner,
+        lease_expires_at=now + timedelta(seconds=lease_seconds),
+        updated_at=now).returning(Job)
+    async with self._session_factory() as db:
+      result = await db.scalars(stmt)
+      jobs = list(result.all())
+      await db.commit()
+    return sorted(jobs, key=lambda job: job.id)
+
+  async def renew_leases(
+      self, owner: str, ids: list[int], lease_seconds: float) -> None:
+    if not ids:
+      return
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)
+    async with self._session_factory() as db:
+      await db.execute(
+          update(Job).where(
+              Job.id.in_(ids),
+              Job.lease_owner == owner).values(lease_expires_at=expires_at))
+      await db.commit()
+
+  async def get(self, job_id: int) -> JobRead | None:
+    async with self._read_session_factory() as db:
+      job = await db.get(Job, job_id)
+      return _to_job_read(job) if job is not None else None
+
+  async def get_many(self, ids: list[int]) -> list[JobRead]:
+    if not ids:
+      return []
+    async with self._read_session_factory() as db:
+      result = await db.scalars(select(Job).where(Job.id.in_(ids)))
+      return [_to_job_read(job) for job in result.all()]
+
+  async def get_latest(self,
+                       limit: int,
+                       before_id: int | None = None) -> list[JobRead]:
+    stmt = select(Job).order_by(Job.id.desc()).limit(limit)
+    if before_id is not None:
+      stmt = stmt.where(Job.id < before_id)
+    async with self._read_session_factory() as db:
+      result = await db.scalars(stmt)
+      return [_to_job_read(job) for job in reversed(result.all())]
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import random
+import re
+from typing import TYPE_CHECKING, Any
+from psyche.job_manager import JobOutput, get_job_manager
+from psyche.llm_cache import cache_key, llm_cache
+from psyche.openai_clients import AUTH_ERROR_EJECT_SECONDS, get_key_pool
+from psyche.provider_health import (
+    get_circuit_breaker, record_failure, record_success)
+from psyche.reasoning import ReasoningStripper
+from psyche.telemetry import LlmCall, llm_cache_hits, track_llm_call
+
+if TYPE_CHECKING:
+  # The SDK is slow to import, so it's loaded on the first request
+  from openai import APIStatusError, AsyncOpenAI
+  from openai.types import CompletionUsage
+  from openai.types.chat import ChatCompletionMessageParam
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+DEFAULT_COMPLETION_TOKENS = 1024
+
+async def chat_completion(
+    provider_id: int,
+    model_name: str,
+    messages: list["ChatCompletionMessageParam"],
+    *,
+    stream: bool = False,
+    use_cache: bool = True,
+    **params: Any) -> str:
+  """Returns the visible text of a chat completion, without reasoning.
+
+  Identical requests are answered from the LLM cache unless `use_cache` is
+  false; fresh results are always written back. With `stream`, the text is
+  published as partial output of the current job while it is generated;
+  streamed completions of one job must therefore not run concurrently.
+
+  Requests run under the provider's concurrency and rate limits, or under
+  those of a key picked from its pool. Rate-limit responses and transient
+  connection or server errors are retried with jittered backoff, unless
+  streamed output has already been published or the provider's circuit has
+  opened. Pooled keys that are rate limited or rejected are ejected for a
+  while and retried on another key. Every provider call is recorded in the
+  telemetry and in the provider's health.
+  """
+  from openai import (
+      APIConnectionError, AuthenticationError, InternalServerError,
+      PermissionDeniedError, RateLimitError)
+
+  key = cache_key(provider_id, model_name, messages, params)
+  if use_cache:
+    cached = await llm_cache.get(key)
+    if cached is not None:
+      logger.debug("LLM cache hit for %s.", model_name)
+      llm_cache_hits.inc(provider=provider_id, model=model_name)
+      if stream:
+        get_job_manager().emit_output(cached)
+      return cached
+
+  pool = await get_key_pool(provider_id)
+  estimated_tokens = _estimate_tokens(messages, params)
+  output = None
+  if stream:
+    # The only buffer of the streamed text, see _stream_completion
+    output = get_job_manager().current_output() or JobOutput()
+  unpublished = len(output.chunks) if output is not None else 0
+
+  def published() -> bool:
+    return output is not None and len(output.chunks) > unpublished
+
+  for attempt in range(1, MAX_ATTEMPTS + 1):
+    try:
+      with track_llm_call(provider_id, model_name) as call:
+        async with pool.slot(estimated_tokens) as api_key:
+          call.sent()
+          try:
+            if stream:
+              text, usage = await _stream_completion(
+                  api_key.client, model_name, messages, params, output, call)
+            else:
+              text, usage = await _complete(
+                  api_key.client, model_name, messages, params)
+          except Exception:
+            # Failed requests give back the tokens reserved for them
+            api_key.limiter.record_tokens(estimated_tokens, 0)
+            raise
+        call.set_usage(usage)
+    except RateLimitError as e:
+      back_off = await pool.on_rate_limited(api_key, _retry_after(e))
+      if attempt == MAX_ATTEMPTS or published():
+        raise
+      logger.warning(
+          f"Rate limited by provider {provider_id} ({model_name}), "
+          f"attempt {attempt}/{MAX_ATTEMPTS}.")
+      if back_off:
+        await asyncio.sleep(_backoff(attempt))
+      continue
+    except (AuthenticationError, PermissionDeniedError) as e:
+      # Another key of the pool may still be accepted
+      await api_key.eject(AUTH_ERROR_EJECT_SECONDS)
+      if attempt == MAX_ATTEMPTS or published() or not pool.has_available():
+        record_failure(provider_id, model_name)
+        raise
+      logger.warning(
+          f"Key {api_key.id} of provider {provider_id} was rejected, "
+          f"attempt {attempt}/{MAX_ATTEMPTS}: {e}")
+      continue
+    except (APIConnectionError, InternalServerError) as e:
+      record_failure(provider_id, model_name)
+      breaker_open = get_circuit_breaker(provider_id).state == "open"
+      if attempt == MAX_ATTEMPTS or published() or breaker_open:
+        raise
+      logger.warning(
+          f"Transient error from provider {provider_id} ({model_name}), "
+          f"attempt {attempt}/{MAX_ATTEMPTS}: {e}")
+      await asyncio.sleep(_backoff(attempt))
+      continue
+    api_key.limiter.on_success()
+    # Provider time only; waits for our own limits aren't the provider's latency
+    record_success(provider_id, model_name, call.duration)
+    if usage is not None:
+      api_key.limiter.record_tokens(estimated_tokens, usage.total_tokens)
+    break
+
+  # Completes even if the caller is cancelled, e.g. as the loser of a hedge
+  await asyncio.shield(llm_cache.set(key, text))
+  return text
+
+async def _complete(
+    client: "AsyncOpenAI", model_name: str,
+    messages: list["ChatCompletionMessageParam"],
+    params: dict[str, Any]) -> tuple[str, "CompletionUsage | None"]:
+  res = await client.chat.completions.create(
+      model=model_name, messages=messages, **params)
+  content = res.choices[0].message.content or ""
+  text = re.sub(r"<think>.*?</think>", "", content, flags=re.DOTALL).strip()
+  return text, res.usage
+
+async def _stream_completion(
+    client: "AsyncOpenAI", model_name: str,
+    messages: list["ChatCompletionMessageParam"], params: dict[str, Any],
+    output: JobOutput, call: LlmCall) -> tuple[str, "CompletionUsage | None"]:
+  stripper = ReasoningStripper()
+  usage = None
+  start = len(output.chunks)
+
+  def publish(text: str) -> None:
+    if text:
+      output.append(text)
+
+  # Streams only report usage when asked, in a final chunk without choices
+  params = {"stream_options": {"include_usage": True}} | params
+  stream = await client.chat.completions.create(
+      model=model_name, messages=messages, stream=True, **params)
+  async for chunk in stream:
+    if chunk.usage:
+      usage = chunk.usage
+    if not chunk.choices:
+      continue
+    delta = chunk.choices[0].delta.content
+    if delta:
+      call.first_token()
+      publish(stripper.feed(delta))
+  publish(stripper.flush())
+  # Read back from the job's output rather than buffered a second time
+  return "".join(output.chunks[start:]).strip(), usage
+
+def _estimate_tokens(
+    messages: list["ChatCompletionMessageParam"], params: dict[str,
+                                                               Any]) -> int:
+  prompt_chars = sum(
+      len(str(message.get("content", ""))) for message in messages)
+  completion_tokens = params.get("max_completion_tokens") or params.get(
+      "max_tokens") or DEFAULT_COMPLETION_TOKENS
+  return prompt_chars // 4 + completion_tokens
+
+def _retry_after(error: "APIStatusError") -> float | None:
+  headers = error.response.headers
+  for name, scale in (("retry-after-ms", 1000), ("retry-after", 1)):
+    try:
+      return float(headers[name]) / scale
+    except (KeyError, ValueError):
+      continue
+  return None
+
+def _backoff(attempt: int) -> float:
+  return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt))
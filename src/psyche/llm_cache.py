@@ -0,0 +1,103 @@
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from psyche.database import ReadSessionLocal, WriteQueue, write_queue
+from psyche.models.llm_cache_models import LlmCacheEntry
+
+def cache_key(
+    provider_id: int, model_name: str, messages: Any, params: dict[str,
+                                                                   Any]) -> str:
+  payload = json.dumps(
+      {
+          "provider_id": provider_id,
+          "model": model_name,
+          "messages": messages,
+          "params": params,
+      },
+      sort_keys=True,
+      default=str)
+  return hashlib.sha256(payload.encode()).hexdigest()
+
+def _utcnow() -> datetime:
+  return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class LlmCache:
+  """Content-addressed cache of LLM completions.
+
+  Recent entries are kept in an in-process LRU in front of the
+  `llm_cache_entry` table. Entries expire after `ttl`, and the table is
+  periodically trimmed to `max_disk_entries`.
+  """
+  ttl: timedelta = timedelta(days=7)
+  max_memory_entries: int = 256
+  max_disk_entries: int = 10000
+  prune_every: int = 100
+
+  def __init__(
+      self,
+      session_factory: async_sessionmaker[AsyncSession] = ReadSessionLocal,
+      writer: WriteQueue = write_queue) -> None:
+    self._session_factory = session_factory
+    self._writer = writer
+    self._memory: OrderedDict[str, tuple[str, datetime]] = OrderedDict()
+    self._writes = 0
+
+  def _remember(self, key: str, content: str, expires_at: datetime) -> None:
+    self._memory[key] = (content, expires_at)
+    self._memory.move_to_end(key)
+    if len(self._memory) > self.max_memory_entries:
+      self._memory.popitem(last=False)
+
+  async def get(self, key: str) -> str | None:
+    now = _utcnow()
+    entry = self._memory.get(key)
+    if entry is not None:
+      content, expires_at = entry
+      if expires_at > now:
+        self._memory.move_to_end(key)
+        return content
+      del self._memory[key]
+
+    async with self._session_factory() as db:
+      row = await db.get(LlmCacheEntry, key)
+    if row is None or row.expires_at <= now:
+      return None
+    self._remember(key, row.content, row.expires_at)
+    return row.content
+
+  async def set(self, key: str, content: str) -> None:
+    expires_at = _utcnow() + self.ttl
+    self._remember(key, content, expires_at)
+    stmt = insert(LlmCacheEntry).values(
+        key=key, content=content, expires_at=expires_at)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LlmCacheEntry.key],
+        set_={
+            "content": stmt.excluded.content,
+            "expires_at": stmt.excluded.expires_at
+        })
+    await self._writer.submit(lambda db: db.execute(stmt))
+
+    self._writes += 1
+    if self._writes % self.prune_every == 0:
+      await self.prune()
+
+  async def prune(self) -> None:
+    overflow = select(LlmCacheEntry.key).order_by(
+        LlmCacheEntry.expires_at.desc()).offset(self.max_disk_entries)
+
+    async def write(db: AsyncSession):
+      await db.execute(
+          delete(LlmCacheEntry).where(LlmCacheEntry.expires_at <= _utcnow()))
+      await db.execute(
+          delete(LlmCacheEntry).where(
+              LlmCacheEntry.key.in_(overflow.scalar_subquery())))
+
+    await self._writer.submit(write)
+
+llm_cache = LlmCache()
@@ -1,7 +1,39 @@
+import atexit
+import json
 import logging
 import logging.config
+import os
+import queue
+import random
+from collections.abc import Callable
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import TypeVar
 from colorama import Fore, Style, init
 
+T = TypeVar("T")
+
+def _parse_pairs(spec: str, convert: Callable[[str], T] = str) -> dict[str, T]:
+  """Parses `name=value` pairs separated by commas."""
+  pairs = (item.split("=", 1) for item in spec.split(",") if "=" in item)
+  return {name.strip(): convert(value.strip()) for name, value in pairs}
+
+# Handlers run on a listener thread, off the event loop
+LOG_QUEUE = os.getenv("PSYCHE_LOG_QUEUE", "1").lower() in ("1", "true", "yes")
+# "text" or "json" (one object per line)
+LOG_FORMAT = os.getenv("PSYCHE_LOG_FORMAT", "text")
+LOG_FILE = os.getenv("PSYCHE_LOG_FILE", "psyche.log")
+LOG_MAX_BYTES = int(os.getenv("PSYCHE_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("PSYCHE_LOG_BACKUP_COUNT", "5"))
+# Each process writes its own file, e.g. psyche.<pid>.log, as rotating a file
+# shared by several processes loses records
+LOG_PER_PROCESS = os.getenv("PSYCHE_LOG_PER_PROCESS",
+                            "").lower() in ("1", "true", "yes")
+# Per-logger levels, e.g. "psyche.llm=INFO,uvicorn.access=WARNING"
+LOG_LEVELS = _parse_pairs(os.getenv("PSYCHE_LOG_LEVELS", ""))
+# Share of DEBUG records kept per logger, e.g. "psyche.llm=0.01"
+LOG_SAMPLING = _parse_pairs(os.getenv("PSYCHE_LOG_SAMPLING", ""), float)
+
 class ColorFormatter(logging.Formatter):
   COLORS = {
       'DEBUG': Fore.BLUE,
@@ -19,6 +51,56 @@ class ColorFormatter(logging.Formatter):
     record.levelname = original_levelname
     return result
 
+class JsonFormatter(logging.Formatter):
+  """Formats records as JSON lines."""
+
+  def format(self, record):
+    created = datetime.fromtimestamp(record.created, timezone.utc)
+    entry = dict(
+        time=created.isoformat(timespec="milliseconds"),
+        level=record.levelname,
+        logger=record.name,
+        message=record.getMessage())
+    if record.exc_info and not record.exc_text:
+      record.exc_text = self.formatException(record.exc_info)
+    if record.exc_text:
+      entry["exception"] = record.exc_text
+    return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+  """Keeps a share of the DEBUG records of the given loggers and their
+  children."""
+
+  def __init__(self, rates: dict[str, float]) -> None:
+    super().__init__()
+    self.rates = rates
+    self._resolved: dict[str, float] = {}
+
+  def filter(self, record):
+    if record.levelno > logging.DEBUG or not self.rates:
+      return True
+    rate = self._resolved.get(record.name)
+    if rate is None:
+      rate = self._resolved[record.name] = self._rate(record.name)
+    return rate >= 1.0 or random.random() < rate
+
+  def _rate(self, name: str) -> float:
+    while name:
+      if name in self.rates:
+        return self.rates[name]
+      name = name.rpartition(".")[0]
+    return 1.0
+
+class PreparedQueueHandler(QueueHandler):
+  """Queues records with their message merged, but leaves formatting,
+  tracebacks included, to the listener thread."""
+
+  def prepare(self, record):
+    record = logging.makeLogRecord(record.__dict__)
+    record.msg = record.getMessage()
+    record.args = None
+    return record
+
 LOG_CONFIG = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -31,6 +113,9 @@ LOG_CONFIG = {
         "plain": {
             "format": "[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s",
             "datefmt": "%Y-%m-%d %H:%M:%S"
+        },
+        "json": {
+            "()": JsonFormatter
         }
     },
     "handlers": {
@@ -40,10 +125,11 @@ LOG_CONFIG = {
             "stream": "ext://sys.stdout"
         },
         "file": {
-            "class": "logging.FileHandler",
+            "class": "logging.handlers.RotatingFileHandler",
             "formatter": "plain",
-            "filename": "psyche.log",
-            "mode": "a",
+            "filename": LOG_FILE,
+            "maxBytes": LOG_MAX_BYTES,
+            "backupCount": LOG_BACKUP_COUNT,
             "encoding": "utf-8"
         }
     },
@@ -59,6 +145,58 @@ LOG_CONFIG = {
     }
 }
 
-def start_logging():
+_listener: QueueListener | None = None
+
+def build_log_config(per_process: bool = LOG_PER_PROCESS) -> dict:
+  handlers = {
+      name: dict(handler)
+      for name, handler in LOG_CONFIG["handlers"].items()
+  }
+  if per_process:
+    root, ext = os.path.splitext(LOG_FILE)
+    handlers["file"]["filename"] = f"{root}.{os.getpid()}{ext}"
+  if LOG_FORMAT == "json":
+    for handler in handlers.values():
+      handler["formatter"] = "json"
+  levels = {
+      name: dict(level=level.upper())
+      for name, level in LOG_LEVELS.items()
+  }
+  return {
+      **LOG_CONFIG,
+      "handlers": handlers,
+      "loggers": {
+          **LOG_CONFIG["loggers"],
+          **levels
+      },
+  }
+
+def start_logging(per_process: bool = LOG_PER_PROCESS):
+  global _listener
   init()
-  logging.config.dictConfig(LOG_CONFIG)
+  stop_logging()
+  logging.config.dictConfig(build_log_config(per_process))
+  root = logging.getLogger()
+  sampling = SamplingFilter(LOG_SAMPLING)
+  if not LOG_QUEUE:
+    for handler in root.handlers:
+      handler.addFilter(sampling)
+    return
+  # Callers only enqueue; the listener thread formats and writes
+  handlers = root.handlers[:]
+  for handler in handlers:
+    root.removeHandler(handler)
+  queue_handler = PreparedQueueHandler(queue.SimpleQueue())
+  queue_handler.addFilter(sampling)
+  root.addHandler(queue_handler)
+  _listener = QueueListener(
+      queue_handler.queue, *handlers, respect_handler_level=True)
+  _listener.start()
+
+@atexit.register
+def stop_logging():
+  """Flushes the queued records and stops the listener thread."""
+  global _listener
+  if _listener is not None:
+    _listener.stop()
+    _listener = None
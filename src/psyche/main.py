@@ -1,25 +1,107 @@
+import argparse
 import asyncio
+import multiprocessing
+import os
 import uvicorn
-from psyche import job_manager
 from psyche.fastapi_app import app
 from psyche.log_config import start_logging
 from psyche.database import run_migrations
-from psyche.job_manager import get_job_manager
+from psyche.job_manager import JobManager, get_job_manager
+from psyche.prompting import compile_templates
+from psyche.services.model_catalog import (
+    MODEL_REFRESH_INTERVAL, refresh_model_catalogs)
+from psyche.schemas.openai_api_schemas import ModelRefreshRequest
 
 WEBSERVER_PORT = 8000
 
-async def main():
+def _schedule_jobs(job_manager: JobManager):
+  if MODEL_REFRESH_INTERVAL > 0:
+    job_manager.schedule(
+        refresh_model_catalogs,
+        MODEL_REFRESH_INTERVAL,
+        request=ModelRefreshRequest())
+
+def _warm_up():
+  """Loads what the first LLM jobs would wait for, in the background so it
+  doesn't delay serving."""
+  import openai  # noqa: F401
+  compile_templates()
+
+async def main(port: int = WEBSERVER_PORT):
   start_logging()
   run_migrations()
-  config = uvicorn.Config(app, port=WEBSERVER_PORT, log_config=None)
+  config = uvicorn.Config(app, port=port, log_config=None)
   server = uvicorn.Server(config)
   job_manager = get_job_manager()
+  _schedule_jobs(job_manager)
   try:
     async with asyncio.TaskGroup() as tg:
       tg.create_task(job_manager.run())
       tg.create_task(server.serve())
+      tg.create_task(asyncio.to_thread(_warm_up))
   except asyncio.CancelledError:
     pass
 
+async def run_executor(schedule_jobs: bool = True):
+  start_logging()
+  job_manager = get_job_manager()
+  job_manager.role = "executor"
+  if schedule_jobs:
+    _schedule_jobs(job_manager)
+  try:
+    async with asyncio.TaskGroup() as tg:
+      tg.create_task(job_manager.run())
+      tg.create_task(asyncio.to_thread(_warm_up))
+  except asyncio.CancelledError:
+    pass
+
+def _executor_process(schedule_jobs: bool):
+  asyncio.run(run_executor(schedule_jobs))
+
+def serve_multiprocess(
+    workers: int, executors: int, port: int = WEBSERVER_PORT):
+  """Runs `workers` API processes and `executors` job-executor processes.
+
+  API workers persist submitted jobs; executors lease them from the job table,
+  so both sides share the queue through the database. Periodic jobs are only
+  scheduled by the first executor. Each process logs to its own file.
+  """
+  # Inherited by the spawned processes
+  os.environ["PSYCHE_LOG_PER_PROCESS"] = "1"
+  start_logging(per_process=True)
+  run_migrations()
+  ctx = multiprocessing.get_context("spawn")
+  processes = [
+      ctx.Process(
+          target=_executor_process,
+          args=(i == 0, ),
+          name=f"psyche-executor-{i}") for i in range(executors)
+  ]
+  for process in processes:
+    process.start()
+  os.environ["PSYCHE_JOB_ROLE"] = "api"
+  try:
+    uvicorn.run(
+        "psyche.fastapi_app:app", port=port, workers=workers, log_config=None)
+  finally:
+    for process in processes:
+      process.terminate()
+    for process in processes:
+      process.join()
+
 if __name__ == "__main__":
-  asyncio.run(main())
+  parser = argparse.ArgumentParser()
+  parser.add_argument(
+      "--port", type=int, default=WEBSERVER_PORT, help="Port of the API.")
+  parser.add_argument(
+      "--workers", type=int, default=1, help="Number of API worker processes.")
+  parser.add_argument(
+      "--executors",
+      type=int,
+      default=0,
+      help="Number of job-executor processes. 0 runs jobs in the API process.")
+  args = parser.parse_args()
+  if args.workers > 1 or args.executors > 0:
+    serve_multiprocess(args.workers, max(args.executors, 1), args.port)
+  else:
+    asyncio.run(main(args.port))
@@ -1,4 +1,6 @@
 from .base import Base
 from .goal_models import Goal, GoalProgressUpdate, GoalStrategy
 from .openai_api_models import OpenAiApiProvider, OpenAiApiKey, OpenAiApiModel
-from .calendar_models import Activity
\ No newline at end of file
+from .calendar_models import Activity
+from .job_models import Job
+from .llm_cache_models import LlmCacheEntry
\ No newline at end of file
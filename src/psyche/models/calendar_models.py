@@ -1,4 +1,5 @@
 from datetime import date as datetime_date
+from sqlalchemy import ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column
 from psyche.models.base import Base
 from psyche.models.mixins import IDMixin
@@ -7,5 +8,11 @@ class Activity(Base, IDMixin):
   __tablename__ = "activity"
 
   description: Mapped[str] = mapped_column()
-  date: Mapped[datetime_date] = mapped_column()
-  completed: Mapped[bool] = mapped_column(default=False)
+  date: Mapped[datetime_date] = mapped_column(index=True)
+  completed: Mapped[bool] = mapped_column(default=False, index=True)
+
+  # Set on generated activities: the goal they serve and a hash of the
+  # generation inputs, to skip regenerating unchanged ones.
+  goal_id: Mapped[int | None] = mapped_column(
+      ForeignKey("goal.id", ondelete="CASCADE"), default=None, index=True)
+  input_hash: Mapped[str | None] = mapped_column(default=None)
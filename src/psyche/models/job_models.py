@@ -0,0 +1,22 @@
+from datetime import datetime
+from typing import Any
+from sqlalchemy import JSON
+from sqlalchemy.orm import Mapped, mapped_column
+from psyche.models.base import Base
+from psyche.models.mixins import IDMixin, TimestampMixin
+
+class Job(Base, IDMixin, TimestampMixin):
+  __tablename__ = "job"
+
+  handler: Mapped[str] = mapped_column()
+  params: Mapped[dict[str, Any]] = mapped_column(JSON)
+  status: Mapped[str] = mapped_column(index=True)
+  # Identifies submissions of the same handler with the same params
+  dedupe_key: Mapped[str | None] = mapped_column(index=True, default=None)
+  info: Mapped[str | None] = mapped_column(default=None)
+  progress: Mapped[dict[str, str] | None] = mapped_column(JSON, default=None)
+  updated_at: Mapped[datetime | None] = mapped_column(default=None)
+
+  # Claim held by an executor process while the job runs
+  lease_owner: Mapped[str | None] = mapped_column(default=None)
+  lease_expires_at: Mapped[datetime | None] = mapped_column(default=None)
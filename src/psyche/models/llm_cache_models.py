@@ -0,0 +1,10 @@
+from datetime import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+from psyche.models.base import Base
+
+class LlmCacheEntry(Base):
+  __tablename__ = "llm_cache_entry"
+
+  key: Mapped[str] = mapped_column(primary_key=True)
+  content: Mapped[str] = mapped_column()
+  expires_at: Mapped[datetime] = mapped_column(index=True)
@@ -1,13 +1,26 @@
 from psyche.models.base import Base
 from psyche.models.mixins import IDMixin
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import ForeignKey, Index, event, update
+from sqlalchemy import ForeignKey, Index, event, select, update
 
 class OpenAiApiProvider(Base, IDMixin):
   __tablename__ = "openai_api_provider"
   name: Mapped[str] = mapped_column()
   base_url: Mapped[str] = mapped_column()
 
+  # Optional request limits; unset means no rate limit and the default
+  # concurrency.
+  max_concurrency: Mapped[int | None] = mapped_column(default=None)
+  requests_per_minute: Mapped[int | None] = mapped_column(default=None)
+  tokens_per_minute: Mapped[int | None] = mapped_column(default=None)
+
+  # Whether all active keys are used, each under the limits above, instead of
+  # only the latest one.
+  key_pool: Mapped[bool] = mapped_column(default=False)
+
+  # Hash of the model list last synced from the provider
+  catalog_fingerprint: Mapped[str | None] = mapped_column(default=None)
+
 class OpenAiApiKey(Base, IDMixin):
   __tablename__ = "openai_api_key"
   key: Mapped[str] = mapped_column()
@@ -19,9 +32,8 @@ class OpenAiApiKey(Base, IDMixin):
 
   __table_args__ = (
       Index(
-          "ix_unique_active_key_per_provider",
+          "ix_active_keys_per_provider",
           "provider_id",
-          unique=True,
           sqlite_where=(active == True)), )
 
 class OpenAiApiModel(Base, IDMixin):
@@ -34,7 +46,15 @@ class OpenAiApiModel(Base, IDMixin):
   provider: Mapped["OpenAiApiProvider"] = relationship()
 
 def _deactivate_other_keys(mapper, connection, target):
-  if target.active:
+  if target.active is None:
+    # The column default isn't applied before the insert
+    target.active = True
+  if not target.active:
+    return
+  key_pool = connection.scalar(
+      select(OpenAiApiProvider.key_pool).where(
+          OpenAiApiProvider.id == target.provider_id))
+  if not key_pool:
     stmt = update(OpenAiApiKey).where(
         OpenAiApiKey.provider_id == target.provider_id, OpenAiApiKey.id
         != target.id, OpenAiApiKey.active == True).values(active=False)
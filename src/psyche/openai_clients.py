@@ -1,28 +1,212 @@
-from openai import AsyncOpenAI
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from psyche.database import SessionLocal
-from psyche.models.openai_api_models import OpenAiApiKey
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+from sqlalchemy import event, select
+from sqlalchemy.orm import ORMExecuteState, Session, object_session
+from psyche.database import ReadSessionLocal
+from psyche.models.openai_api_models import OpenAiApiKey, OpenAiApiProvider
 from psyche.exceptions import ResourceNotFoundError
+from psyche.rate_limiting import (
+    ProviderLimiter, get_key_limiter, get_provider_limiter)
 
-clients: dict[int, AsyncOpenAI] = {}
+if TYPE_CHECKING:
+  # The SDK is slow to import, so it's loaded on the first client
+  from openai import AsyncOpenAI
 
-async def get_openai_client(pid: int) -> AsyncOpenAI:
-  async with SessionLocal() as db:
-    api_key = await db.scalar(
-        select(OpenAiApiKey).options(selectinload(OpenAiApiKey.provider)).where(
-            OpenAiApiKey.provider_id == pid, OpenAiApiKey.active))
-    if not api_key:
+# Resolved provider_id -> key pool (clients carrying base_url and the active
+# keys). Entries are dropped explicitly when providers or keys change; the TTL
+# only bounds staleness from writes made by other processes.
+CLIENT_CACHE_TTL = 60.0
+# How long a key is skipped after a rate-limit response without a
+# retry-after, or after being rejected
+RATE_LIMIT_EJECT_SECONDS = 10.0
+AUTH_ERROR_EJECT_SECONDS = 300.0
+
+@dataclass(eq=False)
+class ProviderKey:
+  id: int
+  client: "AsyncOpenAI"
+  limiter: ProviderLimiter
+  ejected_until: float = 0.0
+
+  async def eject(self, seconds: float) -> None:
+    self.ejected_until = max(self.ejected_until, time.monotonic() + seconds)
+    # Requests queued on this key move on to the available ones
+    await self.limiter.wake()
+
+  @property
+  def available(self) -> bool:
+    return self.ejected_until <= time.monotonic()
+
+class KeyPool:
+  """The active keys of a provider, each with its own limiter.
+
+  Providers without `key_pool` have a single key using the provider's
+  limiter. Pooled keys are picked least-loaded first, round-robin among
+  equally loaded ones, skipping ejected keys while others are available.
+  """
+
+  def __init__(self, pid: int, keys: list[ProviderKey]) -> None:
+    self.pid = pid
+    self.keys = keys
+
+  def pick(self) -> ProviderKey:
+    """Returns the next key and advances the rotation past it."""
+    key = self.peek()
+    last_picked[self.pid] = key.id
+    return key
+
+  def peek(self) -> ProviderKey:
+    """Returns the key `pick` would return, without advancing the rotation."""
+    ids = [key.id for key in self.keys]
+    last = last_picked.get(self.pid)
+    start = ids.index(last) + 1 if last in ids else 0
+    n = len(self.keys)
+    rotated = [self.keys[(start + i) % n] for i in range(n)]
+    available = [key for key in rotated if key.available]
+    if not available:
+      return min(self.keys, key=lambda key: key.ejected_until)
+    return min(available, key=lambda key: key.limiter.load)
+
+  def has_available(self) -> bool:
+    return any(key.available for key in self.keys)
+
+  @asynccontextmanager
+  async def slot(self, estimated_tokens: int = 0) -> AsyncIterator[ProviderKey]:
+    """Picks a key and holds a slot of its limiter.
+
+    A key ejected while waiting for its slot is given up for another one.
+    """
+    while True:
+      key = self.pick()
+
+      def abandon(key: ProviderKey = key) -> bool:
+        return not key.available and self.has_available()
+
+      async with key.limiter.slot(estimated_tokens, abandon) as acquired:
+        if acquired:
+          yield key
+          return
+
+  async def on_rate_limited(
+      self, key: ProviderKey, retry_after: float | None) -> bool:
+    """Records a rate-limit response of `key` and returns whether the retry
+    should back off."""
+    if len(self.keys) == 1:
+      key.limiter.on_rate_limited(retry_after)
+      return retry_after is None
+    # The other keys take the load while this one is ejected
+    key.limiter.on_rate_limited(None)
+    await key.eject(retry_after or RATE_LIMIT_EJECT_SECONDS)
+    return not self.has_available()
+
+key_pools: dict[int, tuple[KeyPool, float]] = {}
+# key_id -> key, shared by all resolutions so that ejections stick
+provider_keys: dict[int, ProviderKey] = {}
+# provider_id -> key_id last picked, so the rotation survives re-resolutions
+last_picked: dict[int, int] = {}
+_generation = 0
+
+async def get_key_pool(pid: int) -> KeyPool:
+  from openai import AsyncOpenAI
+
+  cached = key_pools.get(pid)
+  if cached is not None:
+    pool, resolved_at = cached
+    if time.monotonic() - resolved_at < CLIENT_CACHE_TTL:
+      return pool
+
+  generation = _generation
+  async with ReadSessionLocal() as db:
+    provider = await db.get(OpenAiApiProvider, pid)
+    if not provider:
       raise ResourceNotFoundError()
-    provider = api_key.provider
+    api_keys = (
+        await db.scalars(
+            select(OpenAiApiKey).where(
+                OpenAiApiKey.provider_id == pid,
+                OpenAiApiKey.active).order_by(OpenAiApiKey.id))).all()
+  if not api_keys:
+    raise ResourceNotFoundError()
+  if not provider.key_pool:
+    api_keys = api_keys[-1:]
+
+  keys = []
+  for api_key in api_keys:
+    if provider.key_pool:
+      limiter = get_key_limiter(api_key.id)
+    else:
+      limiter = get_provider_limiter(pid)
+    limiter.configure(
+        max_concurrency=provider.max_concurrency,
+        requests_per_minute=provider.requests_per_minute,
+        tokens_per_minute=provider.tokens_per_minute)
+    key = provider_keys.get(api_key.id)
+    if not (key is not None and isinstance(key.client, AsyncOpenAI)
+            and key.client.base_url == provider.base_url
+            and key.client.api_key == api_key.key):
+      # Retries are handled by the LLM call path, under the provider's limits
+      client = AsyncOpenAI(
+          base_url=provider.base_url, api_key=api_key.key, max_retries=0)
+      key = provider_keys[api_key.id] = ProviderKey(
+          id=api_key.id, client=client, limiter=limiter)
+    key.limiter = limiter
+    keys.append(key)
+  pool = KeyPool(pid, keys)
+
+  # Don't cache a resolution that raced with an invalidation
+  if generation == _generation:
+    key_pools[pid] = (pool, time.monotonic())
+  return pool
+
+async def get_openai_client(pid: int) -> "AsyncOpenAI":
+  """Returns a client of the provider's next key, with the SDK's retries.
+
+  Only LLM calls retry under the provider's limits; other requests, such as
+  listing models, keep the SDK's own retries.
+  """
+  from openai import DEFAULT_MAX_RETRIES
+
+  client = (await get_key_pool(pid)).peek().client
+  return client.with_options(max_retries=DEFAULT_MAX_RETRIES)
+
+def invalidate_openai_client(pid: int | None = None) -> None:
+  global _generation
+  _generation += 1
+  if pid is None:
+    key_pools.clear()
+  else:
+    key_pools.pop(pid, None)
+
+def _mark_changed(target, pid: int) -> None:
+  invalidate_openai_client(pid)
+  # Invalidate again once the change is visible to other sessions
+  session = object_session(target)
+  if session is not None:
+    session.info.setdefault("changed_openai_providers", set()).add(pid)
+
+def _on_key_change(mapper, connection, target: OpenAiApiKey) -> None:
+  _mark_changed(target, target.provider_id)
+
+def _on_provider_change(mapper, connection, target: OpenAiApiProvider) -> None:
+  _mark_changed(target, target.id)
 
-  client = clients.get(pid, None)
+@event.listens_for(Session, "do_orm_execute")
+def _on_bulk_change(state: ORMExecuteState) -> None:
+  # Bulk UPDATE and DELETE statements skip the mapper events below
+  if not (state.is_update or state.is_delete) or state.bind_mapper is None:
+    return
+  if state.bind_mapper.class_ in (OpenAiApiKey, OpenAiApiProvider):
+    invalidate_openai_client()
+    state.session.info.setdefault("changed_openai_providers", set()).add(None)
 
-  if isinstance(
-      client, AsyncOpenAI
-  ) and client.base_url == provider.base_url and client.api_key == api_key.key:
-    return client
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+  for pid in session.info.pop("changed_openai_providers", ()):
+    invalidate_openai_client(pid)
 
-  new_client = AsyncOpenAI(base_url=provider.base_url, api_key=api_key.key)
-  clients[pid] = new_client
-  return new_client
+for _event_name in ("after_insert", "after_update", "after_delete"):
+  event.listen(OpenAiApiKey, _event_name, _on_key_change)
+  event.listen(OpenAiApiProvider, _event_name, _on_provider_change)
@@ -0,0 +1,118 @@
+import logging
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from psyche.database import engine, read_engine
+
+logger = logging.getLogger(__name__)
+
+# Off by default: no engine listeners or middleware are installed then.
+PROFILING = os.getenv("PSYCHE_PROFILING", "").lower() in ("1", "true", "yes")
+SLOW_REQUEST_SECONDS = float(os.getenv("PSYCHE_SLOW_REQUEST_MS", "500")) / 1000
+SLOW_QUERY_SECONDS = float(os.getenv("PSYCHE_SLOW_QUERY_MS", "100")) / 1000
+# A statement run this often in one request is most likely an N+1 pattern
+REPEATED_QUERY_WARNING = 20
+
+@dataclass(slots=True)
+class RequestProfile:
+  queries: int = 0
+  query_time: float = 0.0
+  statements: Counter[str] = field(default_factory=Counter)
+
+  def add_query(self, statement: str, duration: float) -> None:
+    self.queries += 1
+    self.query_time += duration
+    self.statements[statement] += 1
+
+  def server_timing(self, total: float) -> str:
+    return (
+        f'db;dur={self.query_time * 1000:.1f};desc="{self.queries} queries", '
+        f"total;dur={total * 1000:.1f}")
+
+  def most_repeated(self) -> tuple[str, int] | None:
+    top = self.statements.most_common(1)
+    return top[0] if top else None
+
+_current_profile: ContextVar[RequestProfile | None] = ContextVar(
+    "request_profile", default=None)
+
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany) -> None:
+  conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany) -> None:
+  duration = time.perf_counter() - conn.info["query_started"].pop()
+  profile = _current_profile.get()
+  if profile is not None:
+    profile.add_query(statement, duration)
+  if duration >= SLOW_QUERY_SECONDS:
+    logger.warning(
+        f"Slow query ({duration * 1000:.1f} ms): {' '.join(statement.split())}")
+
+def _handle_error(exception_context) -> None:
+  conn = exception_context.connection
+  if conn is not None and conn.info.get("query_started"):
+    conn.info["query_started"].pop()
+
+def instrument_engine(sync_engine: Engine) -> None:
+  event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+  event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+  event.listen(sync_engine, "handle_error", _handle_error)
+
+class ProfilingMiddleware:
+  """Counts and times the queries of each request.
+
+  Responses get a `Server-Timing` header; slow requests and requests
+  repeating a statement suspiciously often are logged. Queries run by the
+  write queue happen outside the request and are not counted.
+  """
+
+  def __init__(self, app: ASGIApp) -> None:
+    self.app = app
+
+  async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+    profile = RequestProfile()
+    token = _current_profile.set(profile)
+    started = time.perf_counter()
+
+    async def send_with_timing(message: Message) -> None:
+      if message["type"] == "http.response.start":
+        headers = MutableHeaders(scope=message)
+        headers.append(
+            "Server-Timing",
+            profile.server_timing(time.perf_counter() - started))
+      await send(message)
+
+    try:
+      await self.app(scope, receive, send_with_timing)
+    finally:
+      _current_profile.reset(token)
+      _log_request(scope, profile, time.perf_counter() - started)
+
+def _log_request(
+    scope: Scope, profile: RequestProfile, duration: float) -> None:
+  request = f"{scope['method']} {scope['path']}"
+  if duration >= SLOW_REQUEST_SECONDS:
+    logger.warning(
+        f"Slow request {request}: {duration * 1000:.1f} ms, "
+        f"{profile.queries} queries in {profile.query_time * 1000:.1f} ms")
+  repeated = profile.most_repeated()
+  if repeated is not None and repeated[1] >= REPEATED_QUERY_WARNING:
+    statement, count = repeated
+    logger.warning(
+        f"Request {request} ran a statement {count} times: "
+        f"{' '.join(statement.split())}")
+
+if PROFILING:
+  for sync_engine in {engine.sync_engine, read_engine.sync_engine}:
+    instrument_engine(sync_engine)
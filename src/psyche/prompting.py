@@ -1,4 +1,122 @@
-from jinja2 import Environment, PackageLoader
+import functools
+import hashlib
+import os
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Any, NamedTuple
 
-jinja_env = Environment(
-    loader=PackageLoader("psyche", "prompts"), autoescape=False)
\ No newline at end of file
+if TYPE_CHECKING:
+  from jinja2 import Environment, Template, nodes
+
+_PLAIN_TYPES = (str, int, float, bool, type(None), date, datetime)
+
+class CompiledPrompt(NamedTuple):
+  name: str
+  template: "Template"
+  version: str
+  # Variable -> attributes read from it, or None if the value is used as a
+  # whole. None for templates reading other templates.
+  fields: dict[str, frozenset[str] | None] | None
+
+class PromptRenderer:
+  """Renders prompt templates and memoizes the results.
+
+  A render is keyed by the template version, i.e. a hash of its source, and
+  the values the template reads: attributes it reads from a variable, like
+  `goal.title`, or the whole value of plain variables. Identical prompts are
+  then rendered once.
+  """
+  max_entries: int = 4096
+
+  def __init__(self, env: "Environment") -> None:
+    self._env = env
+    self._compiled: dict[str, CompiledPrompt] = {}
+    self._rendered: OrderedDict[tuple, str] = OrderedDict()
+
+  def compile(self, name: str) -> CompiledPrompt:
+    compiled = self._compiled.get(name)
+    if compiled is None:
+      source, _, _ = self._env.loader.get_source(self._env, name)
+      compiled = self._compiled[name] = CompiledPrompt(
+          name=name,
+          template=self._env.get_template(name),
+          version=hashlib.sha256(source.encode()).hexdigest()[:16],
+          fields=_read_fields(self._env.parse(source)))
+    return compiled
+
+  def compile_all(self) -> None:
+    for name in self._env.list_templates():
+      self.compile(name)
+
+  def render(self, name: str, **context: Any) -> str:
+    compiled = self.compile(name)
+    key = _render_key(compiled, context)
+    if key is None:
+      return compiled.template.render(**context)
+    text = self._rendered.get(key)
+    if text is not None:
+      self._rendered.move_to_end(key)
+      return text
+    text = self._rendered[key] = compiled.template.render(**context)
+    if len(self._rendered) > self.max_entries:
+      self._rendered.popitem(last=False)
+    return text
+
+def _read_fields(
+    ast: "nodes.Template") -> dict[str, frozenset[str] | None] | None:
+  from jinja2 import nodes
+
+  if any(ast.find_all(
+      (nodes.Extends, nodes.Include, nodes.Import, nodes.FromImport))):
+    return None
+  attrs: dict[str, set[str]] = {}
+  read_through_attr = set()
+  for node in ast.find_all(nodes.Getattr):
+    if isinstance(node.node, nodes.Name):
+      read_through_attr.add(id(node.node))
+      attrs.setdefault(node.node.name, set()).add(node.attr)
+  fields = {name: frozenset(names) for name, names in attrs.items()}
+  for node in ast.find_all(nodes.Name):
+    if node.ctx == "load" and id(node) not in read_through_attr:
+      fields[node.name] = None
+  return fields
+
+def _render_key(
+    compiled: CompiledPrompt, context: dict[str, Any]) -> tuple | None:
+  """Returns the memo key of a render, or None if it can't be memoized."""
+  if compiled.fields is None:
+    return None
+  values = []
+  for var, attrs in sorted(compiled.fields.items()):
+    value = context.get(var)
+    if attrs is not None:
+      value = tuple(getattr(value, attr, None) for attr in sorted(attrs))
+      plain = all(isinstance(v, _PLAIN_TYPES) for v in value)
+    else:
+      plain = isinstance(value, _PLAIN_TYPES)
+    if not plain:
+      return None
+    values.append(value)
+  return (compiled.name, compiled.version, *values)
+
+@functools.cache
+def get_prompt_renderer() -> PromptRenderer:
+  # Jinja is loaded on the first render, not with the services
+  from jinja2 import Environment, FileSystemBytecodeCache, PackageLoader
+
+  # Templates ship with the package, so they are compiled once per process
+  # and their bytecode is cached on disk across processes and restarts.
+  env = Environment(
+      loader=PackageLoader("psyche", "prompts"),
+      autoescape=False,
+      auto_reload=False,
+      bytecode_cache=FileSystemBytecodeCache(
+          os.getenv("PSYCHE_TEMPLATE_CACHE_DIR")))
+  return PromptRenderer(env)
+
+def render_prompt(name: str, **context: Any) -> str:
+  return get_prompt_renderer().render(name, **context)
+
+def compile_templates() -> None:
+  """Compiles all prompt templates up front, e.g. after startup."""
+  get_prompt_renderer().compile_all()
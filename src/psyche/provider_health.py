@@ -0,0 +1,119 @@
+import logging
+import time
+from collections import deque
+from typing import Literal
+
+logger = logging.getLogger(__name__)
+
+# Weight of the latest observation in the moving averages
+EWMA_ALPHA = 0.2
+# Successful latencies kept per model for percentiles
+LATENCY_WINDOW = 100
+
+BreakerState = Literal["closed", "open", "half_open"]
+
+class ModelHealth:
+  """Moving averages of the latency and error rate of one provider's model."""
+
+  def __init__(self) -> None:
+    self.latency: float | None = None
+    self.error_rate = 0.0
+    self.requests = 0
+    self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+  def on_success(self, latency: float) -> None:
+    self.requests += 1
+    self.latency = latency if self.latency is None else _ewma(
+        self.latency, latency)
+    self.error_rate = _ewma(self.error_rate, 0.0)
+    self._latencies.append(latency)
+
+  def on_failure(self) -> None:
+    self.requests += 1
+    self.error_rate = _ewma(self.error_rate, 1.0)
+
+  def percentile(self, q: float, min_samples: int = 1) -> float | None:
+    """Returns the `q` quantile of the recent successful latencies."""
+    if len(self._latencies) < max(min_samples, 1):
+      return None
+    latencies = sorted(self._latencies)
+    return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+class CircuitBreaker:
+  """Stops requests to a failing provider for a while.
+
+  The breaker opens after `failure_threshold` consecutive failures. Once
+  `cooldown` has passed, a single trial request is let through; its success
+  closes the breaker, its failure opens it again.
+  """
+  failure_threshold: int = 5
+  cooldown: float = 30.0
+
+  def __init__(self, pid: int) -> None:
+    self.pid = pid
+    self.failures = 0
+    self._opened_at: float | None = None
+    self._trial_at: float | None = None
+
+  @property
+  def state(self) -> BreakerState:
+    if self._opened_at is None:
+      return "closed"
+    if time.monotonic() - self._opened_at < self.cooldown:
+      return "open"
+    return "half_open"
+
+  def allow(self) -> bool:
+    """Returns whether a request may be sent, taking the trial if half-open."""
+    state = self.state
+    if state != "half_open":
+      return state == "closed"
+    now = time.monotonic()
+    # A trial that never reported back doesn't block the next one forever
+    if self._trial_at is not None and now - self._trial_at < self.cooldown:
+      return False
+    self._trial_at = now
+    return True
+
+  def on_success(self) -> None:
+    if self._opened_at is not None:
+      logger.info("Circuit of provider %s closed.", self.pid)
+    self.failures = 0
+    self._opened_at = None
+    self._trial_at = None
+
+  def on_failure(self) -> None:
+    self.failures += 1
+    self._trial_at = None
+    if self._opened_at is not None or self.failures >= self.failure_threshold:
+      if self.state != "open":
+        logger.warning(
+            f"Circuit of provider {self.pid} opened after "
+            f"{self.failures} failures.")
+      self._opened_at = time.monotonic()
+
+def _ewma(average: float, value: float) -> float:
+  return average + EWMA_ALPHA * (value - average)
+
+model_health: dict[tuple[int, str], ModelHealth] = {}
+circuit_breakers: dict[int, CircuitBreaker] = {}
+
+def get_model_health(pid: int, model_name: str) -> ModelHealth:
+  health = model_health.get((pid, model_name))
+  if health is None:
+    health = model_health[(pid, model_name)] = ModelHealth()
+  return health
+
+def get_circuit_breaker(pid: int) -> CircuitBreaker:
+  breaker = circuit_breakers.get(pid)
+  if breaker is None:
+    breaker = circuit_breakers[pid] = CircuitBreaker(pid)
+  return breaker
+
+def record_success(pid: int, model_name: str, latency: float) -> None:
+  get_model_health(pid, model_name).on_success(latency)
+  get_circuit_breaker(pid).on_success()
+
+def record_failure(pid: int, model_name: str) -> None:
+  get_model_health(pid, model_name).on_failure()
+  get_circuit_breaker(pid).on_failure()
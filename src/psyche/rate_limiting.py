@@ -0,0 +1,163 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from collections.abc import AsyncIterator, Callable
+
+class TokenBucket:
+  """Continuously refilling bucket of `rate_per_minute` tokens.
+
+  The balance may go negative when actual usage exceeds what was reserved;
+  later acquisitions then wait for the debt to be refilled.
+  """
+
+  def __init__(self, rate_per_minute: float) -> None:
+    self.rate_per_minute = rate_per_minute
+    self._tokens = rate_per_minute
+    self._updated_at = time.monotonic()
+
+  def _refill(self) -> None:
+    now = time.monotonic()
+    self._tokens = min(
+        self.rate_per_minute,
+        self._tokens + (now - self._updated_at) * self.rate_per_minute / 60)
+    self._updated_at = now
+
+  def reserve(self, amount: float) -> float:
+    """Takes `amount` tokens and returns how long to wait before using them."""
+    self._refill()
+    # Requests larger than the bucket would never fit; let them drain it.
+    amount = min(amount, self.rate_per_minute)
+    self._tokens -= amount
+    if self._tokens >= 0:
+      return 0.0
+    return -self._tokens * 60 / self.rate_per_minute
+
+  def adjust(self, amount: float) -> None:
+    """Corrects a reservation once the actual usage is known."""
+    self._refill()
+    self._tokens -= amount
+
+class ProviderLimiter:
+  """Concurrency and rate limits for the requests sent to one provider, or to
+  one key of a provider that pools its keys.
+
+  Concurrency adapts AIMD-style: every success raises the limit by roughly one
+  per window of `limit` requests, every rate-limit response halves it.
+  """
+  min_concurrency: float = 1.0
+
+  def __init__(self) -> None:
+    self.max_concurrency: float = 8.0
+    self.concurrency_limit: float = self.max_concurrency
+    self._in_flight = 0
+    self._waiting = 0
+    self._changed = asyncio.Condition()
+    self._requests: TokenBucket | None = None
+    self._tokens: TokenBucket | None = None
+    self._blocked_until = 0.0
+
+  def configure(
+      self,
+      max_concurrency: int | None = None,
+      requests_per_minute: int | None = None,
+      tokens_per_minute: int | None = None) -> None:
+    self.max_concurrency = float(max_concurrency or 8)
+    self.concurrency_limit = min(self.concurrency_limit, self.max_concurrency)
+    self._requests = _update_bucket(self._requests, requests_per_minute)
+    self._tokens = _update_bucket(self._tokens, tokens_per_minute)
+
+  @property
+  def load(self) -> float:
+    """Requests in flight or waiting, relative to the concurrency limit."""
+    return (self._in_flight + self._waiting) / self.concurrency_limit
+
+  @asynccontextmanager
+  async def slot(
+      self,
+      estimated_tokens: int = 0,
+      abandon: Callable[[], bool] | None = None) -> AsyncIterator[bool]:
+    """Holds a request slot, once the concurrency and rate limits allow it.
+
+    `abandon` is checked whenever the limiter is woken, see `wake`. Once it
+    returns true, the block runs with False instead, without a slot and
+    without taking from the rate limits.
+    """
+
+    def free_or_abandoned() -> bool:
+      return (
+          self._in_flight < int(self.concurrency_limit)
+          or abandon is not None and abandon())
+
+    self._waiting += 1
+    try:
+      async with self._changed:
+        await self._changed.wait_for(free_or_abandoned)
+        acquired = abandon is None or not abandon()
+        if acquired:
+          self._in_flight += 1
+    finally:
+      self._waiting -= 1
+    if not acquired:
+      yield False
+      return
+    try:
+      delay = max(self._blocked_until - time.monotonic(), 0.0)
+      if self._requests is not None:
+        delay = max(delay, self._requests.reserve(1))
+      if self._tokens is not None and estimated_tokens:
+        delay = max(delay, self._tokens.reserve(estimated_tokens))
+      if delay > 0:
+        await asyncio.sleep(delay)
+      yield True
+    finally:
+      async with self._changed:
+        self._in_flight -= 1
+        self._changed.notify_all()
+
+  async def wake(self) -> None:
+    """Lets waiting requests check whether to abandon their wait."""
+    async with self._changed:
+      self._changed.notify_all()
+
+  def record_tokens(self, estimated_tokens: int, actual_tokens: int) -> None:
+    if self._tokens is not None:
+      self._tokens.adjust(actual_tokens - estimated_tokens)
+
+  def on_success(self) -> None:
+    self.concurrency_limit = min(
+        self.max_concurrency,
+        self.concurrency_limit + 1 / self.concurrency_limit)
+
+  def on_rate_limited(self, retry_after: float | None) -> None:
+    self.concurrency_limit = max(
+        self.min_concurrency, self.concurrency_limit / 2)
+    if retry_after:
+      self._blocked_until = max(
+          self._blocked_until,
+          time.monotonic() + retry_after)
+
+def _update_bucket(
+    bucket: TokenBucket | None,
+    rate_per_minute: int | None) -> TokenBucket | None:
+  if not rate_per_minute:
+    return None
+  if bucket is None:
+    return TokenBucket(rate_per_minute)
+  bucket.rate_per_minute = rate_per_minute
+  return bucket
+
+provider_limiters: dict[int, ProviderLimiter] = {}
+
+def get_provider_limiter(pid: int) -> ProviderLimiter:
+  limiter = provider_limiters.get(pid)
+  if limiter is None:
+    limiter = provider_limiters[pid] = ProviderLimiter()
+  return limiter
+
+key_limiters: dict[int, ProviderLimiter] = {}
+
+def get_key_limiter(key_id: int) -> ProviderLimiter:
+  limiter = key_limiters.get(key_id)
+  if limiter is None:
+    limiter = key_limiters[key_id] = ProviderLimiter()
+  return limiter
@@ -0,0 +1,53 @@
+class ReasoningStripper:
+  """Incrementally removes <think>...</think> sections from streamed text.
+
+  Text is fed in arbitrary chunks; tags split across chunk boundaries are
+  held back until they can be resolved, so only the pending tail is buffered.
+  Leading whitespace of the visible output is dropped, mirroring the
+  `.strip()` applied to non-streamed responses.
+  """
+  open_tag = "<think>"
+  close_tag = "</think>"
+
+  def __init__(self) -> None:
+    self._pending = ""
+    self._in_reasoning = False
+    self._started = False
+
+  def feed(self, chunk: str) -> str:
+    self._pending += chunk
+    visible: list[str] = []
+    while True:
+      tag = self.close_tag if self._in_reasoning else self.open_tag
+      idx = self._pending.find(tag)
+      if idx == -1:
+        keep = _partial_tag_len(self._pending, tag)
+        cut = len(self._pending) - keep
+        if not self._in_reasoning:
+          visible.append(self._pending[:cut])
+        self._pending = self._pending[cut:]
+        break
+      if not self._in_reasoning:
+        visible.append(self._pending[:idx])
+      self._pending = self._pending[idx + len(tag):]
+      self._in_reasoning = not self._in_reasoning
+    return self._emit("".join(visible))
+
+  def flush(self) -> str:
+    # An unterminated reasoning section is dropped.
+    rest = "" if self._in_reasoning else self._pending
+    self._pending = ""
+    return self._emit(rest)
+
+  def _emit(self, text: str) -> str:
+    if not self._started:
+      text = text.lstrip()
+      self._started = bool(text)
+    return text
+
+def _partial_tag_len(text: str, tag: str) -> int:
+  """Length of the longest suffix of `text` that is a proper prefix of `tag`."""
+  for n in range(min(len(tag) - 1, len(text)), 0, -1):
+    if text.endswith(tag[:n]):
+      return n
+  return 0
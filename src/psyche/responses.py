@@ -0,0 +1,13 @@
+from typing import Any
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+class FastJSONResponse(JSONResponse):
+  """JSON response encoded by pydantic-core.
+
+  Returned directly from a route, the content skips `response_model`
+  validation, so it must already match the documented schema.
+  """
+
+  def render(self, content: Any) -> bytes:
+    return to_json(content)
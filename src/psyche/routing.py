@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Any
+from sqlalchemy import select
+from psyche.database import ReadSessionLocal
+from psyche.exceptions import ProviderUnavailableError
+from psyche.llm import chat_completion
+from psyche.models.openai_api_models import OpenAiApiModel
+from psyche.provider_health import (
+    get_circuit_breaker, get_model_health, record_failure)
+from psyche.telemetry import llm_hedges
+
+if TYPE_CHECKING:
+  from openai.types.chat import ChatCompletionMessageParam
+
+logger = logging.getLogger(__name__)
+
+# Upper bound of a routed completion, retries, fallback and hedge included
+LLM_TIMEOUT = float(os.getenv("PSYCHE_LLM_TIMEOUT", "300"))
+HEDGING = os.getenv("PSYCHE_HEDGING", "").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = 0.95
+# Latencies needed before the percentile is trusted for hedging
+MIN_HEDGE_SAMPLES = 20
+# How long the bookmarked equivalents of a model are cached
+ALTERNATIVES_TTL = 60.0
+
+# model_id -> bookmarked models of the same name on other providers
+alternatives: dict[int, tuple[list[OpenAiApiModel], float]] = {}
+
+async def routed_completion(
+    model: OpenAiApiModel,
+    messages: list["ChatCompletionMessageParam"],
+    *,
+    stream: bool = False,
+    use_cache: bool = True,
+    **params: Any) -> str:
+  """Returns `chat_completion` of `model`, routed around slow or failing
+  providers.
+
+  Equivalents of a model are bookmarked models of the same name on other
+  providers. While the circuit of the model's provider is open, the fastest
+  equivalent is used instead, also for requests whose failure opened it.
+  With hedging enabled, a request still running after the model's p95
+  latency is duplicated to an equivalent; the first answer wins and the other
+  request is cancelled. Streamed requests are not hedged, as both would
+  publish output.
+  """
+  if not get_circuit_breaker(model.provider_id).allow():
+    model = await _fallback(model)
+  try:
+    async with asyncio.timeout(LLM_TIMEOUT):
+      try:
+        return await _hedged_completion(
+            model, messages, stream=stream, use_cache=use_cache, **params)
+      except Exception:
+        # Failures that opened the circuit move on to an equivalent
+        if stream or get_circuit_breaker(model.provider_id).state != "open":
+          raise
+        model = await _fallback(model)
+      return await _completion(
+          model, messages, stream=stream, use_cache=use_cache, **params)
+  except TimeoutError:
+    record_failure(model.provider_id, model.name)
+    raise
+
+async def _fallback(model: OpenAiApiModel) -> OpenAiApiModel:
+  fallback = await _fastest_alternative(model)
+  if fallback is None:
+    raise ProviderUnavailableError(
+        f"Provider {model.provider_id} is unavailable and {model.name} has "
+        "no bookmarked equivalent.")
+  logger.warning(
+      f"Routing {model.name} from provider {model.provider_id} to "
+      f"provider {fallback.provider_id}.")
+  return fallback
+
+async def _hedged_completion(
+    model: OpenAiApiModel, messages: list["ChatCompletionMessageParam"], *,
+    stream: bool, **kwargs: Any) -> str:
+  delay = get_model_health(model.provider_id, model.name).percentile(
+      HEDGE_PERCENTILE, MIN_HEDGE_SAMPLES)
+  if stream or not HEDGING or delay is None:
+    return await _completion(model, messages, stream=stream, **kwargs)
+
+  def attempt(model: OpenAiApiModel, **overrides: Any) -> asyncio.Task[str]:
+    return asyncio.create_task(
+        _completion(model, messages, stream=stream, **(kwargs | overrides)))
+
+  tasks = [attempt(model)]
+  try:
+    done, _ = await asyncio.wait(tasks, timeout=delay)
+    if done:
+      return tasks[0].result()
+    hedge = await _fastest_alternative(model)
+    if hedge is None or not get_circuit_breaker(hedge.provider_id).allow():
+      return await tasks[0]
+    logger.debug(
+        f"Hedging {model.name} of provider {model.provider_id} after "
+        f"{delay:.2f}s with provider {hedge.provider_id}.")
+    # The primary has already missed the cache
+    tasks.append(attempt(hedge, use_cache=False))
+    return await _first_result(tasks)
+  finally:
+    for task in tasks:
+      task.cancel()
+
+async def _completion(
+    model: OpenAiApiModel, messages: list["ChatCompletionMessageParam"],
+    **kwargs: Any) -> str:
+  return await chat_completion(
+      model.provider_id, model.name, messages, **kwargs)
+
+async def _first_result(tasks: list[asyncio.Task[str]]) -> str:
+  """Returns the first successful result of the primary and hedged tasks, or
+  raises the error of the last one to fail."""
+  pending = set(tasks)
+  while True:
+    done, pending = await asyncio.wait(
+        pending, return_when=asyncio.FIRST_COMPLETED)
+    succeeded = [task for task in done if task.exception() is None]
+    if succeeded:
+      task = succeeded[0]
+      llm_hedges.inc(winner="primary" if task is tasks[0] else "hedge")
+      return task.result()
+    if not pending:
+      return done.pop().result()
+
+async def _fastest_alternative(model: OpenAiApiModel) -> OpenAiApiModel | None:
+  candidates = [
+      alternative for alternative in await _alternatives(model)
+      if get_circuit_breaker(alternative.provider_id).state != "open"
+  ]
+  if not candidates:
+    return None
+  # Unmeasured ones first, so that they get measured
+  return min(
+      candidates,
+      key=lambda alternative: get_model_health(
+          alternative.provider_id, alternative.name).latency or 0.0)
+
+async def _alternatives(model: OpenAiApiModel) -> list[OpenAiApiModel]:
+  cached = alternatives.get(model.id)
+  if cached is not None and time.monotonic() - cached[1] < ALTERNATIVES_TTL:
+    return cached[0]
+  async with ReadSessionLocal() as db:
+    result = await db.scalars(
+        select(OpenAiApiModel).where(
+            OpenAiApiModel.name == model.name, OpenAiApiModel.provider_id
+            != model.provider_id, OpenAiApiModel.bookmarked))
+    models = list(result)
+  alternatives[model.id] = (models, time.monotonic())
+  return models
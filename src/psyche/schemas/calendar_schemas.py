@@ -6,9 +6,14 @@ class ActivityRead(BaseModel):
   description: str
   date: datetime_date
   completed: bool
+  goal_id: int | None = None
 
   model_config = ConfigDict(from_attributes=True)
 
+class ActivityDay(BaseModel):
+  date: datetime_date
+  activities: list[ActivityRead]
+
 class ActivityCreate(BaseModel):
   description: str
   date: datetime_date
@@ -17,4 +22,5 @@ class ActivityUpdate(BaseModel):
   completed: bool | None = None
 
 class CalendarGenerationRequest(BaseModel):
-  pass
+  model_id: int
+  use_cache: bool = True
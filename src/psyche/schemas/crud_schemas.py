@@ -0,0 +1,13 @@
+from typing import Generic, TypeVar
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+class BatchItemResult(BaseModel, Generic[T]):
+  id: int | None = None
+  status: int
+  item: T | None = None
+  detail: str | None = None
+
+class BatchDeleteRequest(BaseModel):
+  ids: list[int]
@@ -25,6 +25,14 @@ class GoalUpdate(BaseModel):
 
 class StrategyGenerationRequest(BaseModel):
   model_id: int
+  stream: bool = False
+  use_cache: bool = True
+
+class BulkStrategyGenerationRequest(BaseModel):
+  model_id: int
+  goal_ids: list[int] | None = None
+  active: bool | None = None
+  use_cache: bool = True
 
 class GoalStrategyRead(BaseModel):
   id: int  
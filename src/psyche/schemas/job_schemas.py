@@ -1,12 +1,13 @@
 from pydantic import BaseModel
 from typing import Literal
 
-JobStatus = Literal["pending", "done", "error"]
+JobStatus = Literal["pending", "running", "done", "error"]
 
 class JobRead(BaseModel):
   id: int
   status: JobStatus
   info: str | None = None
+  progress: dict[int, JobStatus] | None = None
 
 class JobBatchRequest(BaseModel):
   job_ids: list[int]
@@ -1,19 +1,31 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 class OpenAiApiProviderRead(BaseModel):
   id: int
   name: str
   base_url: str
+  max_concurrency: int | None
+  requests_per_minute: int | None
+  tokens_per_minute: int | None
+  key_pool: bool
 
   model_config = ConfigDict(from_attributes=True)
 
 class OpenAiApiProviderCreate(BaseModel):
   name: str
   base_url: str
+  max_concurrency: int | None = Field(None, ge=1)
+  requests_per_minute: int | None = Field(None, ge=1)
+  tokens_per_minute: int | None = Field(None, ge=1)
+  key_pool: bool = False
 
 class OpenAiApiProviderUpdate(BaseModel):
   name: str | None = None
   base_url: str | None = None
+  max_concurrency: int | None = Field(None, ge=1)
+  requests_per_minute: int | None = Field(None, ge=1)
+  tokens_per_minute: int | None = Field(None, ge=1)
+  key_pool: bool | None = None
 
 class OpenAiApiKeyRead(BaseModel):
   id: int
@@ -42,3 +54,6 @@ class OpenAiApiModelCreate(BaseModel):
 
 class OpenAiApiModelUpdate(BaseModel):
   bookmarked: bool | None = None
+
+class ModelRefreshRequest(BaseModel):
+  provider_ids: list[int] | None = None
@@ -1,15 +1,145 @@
 import asyncio
+import hashlib
+import json
+import logging
 from datetime import date as datetime_date
+from typing import TYPE_CHECKING
 from psyche.schemas.calendar_schemas import CalendarGenerationRequest
-from openai.types.chat import (
-    ChatCompletionSystemMessageParam,
-    ChatCompletionUserMessageParam,
-    ChatCompletionAssistantMessageParam,
-    ChatCompletionMessageParam,
-)
-from openai import APIConnectionError
-from sqlalchemy import select
+from psyche.schemas.job_schemas import JobStatus
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from psyche.database import ReadSessionLocal, write_queue
+from psyche.exceptions import ResourceNotFoundError
+from psyche.job_manager import get_job_manager
+from psyche.routing import routed_completion
+from psyche.models.calendar_models import Activity
+from psyche.models.goal_models import Goal, GoalStrategy
+from psyche.models.openai_api_models import OpenAiApiModel
+from psyche.prompting import render_prompt
+
+if TYPE_CHECKING:
+  from openai.types.chat import ChatCompletionMessageParam
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_CONCURRENCY = 8
 
 async def generate_calendar(
-    date: str, request: CalendarGenerationRequest) -> None:
-  await asyncio.sleep(5)
+    date: datetime_date, request: CalendarGenerationRequest) -> None:
+  """Generates an activity for `date` for every active goal with a strategy.
+
+  Generation is incremental: goals whose prompt is unchanged since their
+  activity for `date` was generated are skipped, and completed activities are
+  kept. New activities are written in one bulk insert, replacing the stale
+  ones. Per-goal status is reported as progress of the current job.
+  """
+  goals_stmt = select(Goal, GoalStrategy.strategy).join(
+      GoalStrategy, GoalStrategy.goal_id == Goal.id).where(Goal.active)
+  existing_stmt = select(
+      Activity.goal_id, Activity.input_hash, Activity.completed).where(
+          Activity.date == date, Activity.goal_id.is_not(None))
+  async with ReadSessionLocal() as db:
+    model = await db.get(OpenAiApiModel, request.model_id)
+    if model is None:
+      raise ResourceNotFoundError()
+    goals = (await db.execute(goals_stmt.order_by(Goal.id))).all()
+    existing = (await db.execute(existing_stmt)).all()
+  existing_by_goal = {row.goal_id: row for row in existing}
+
+  pending: dict[int, tuple[list["ChatCompletionMessageParam"], str]] = {}
+  for goal, strategy in goals:
+    messages = _activity_messages(date, goal, strategy)
+    input_hash = _input_hash(model, messages)
+    current = existing_by_goal.get(goal.id)
+    if current is not None and (current.completed
+                                or current.input_hash == input_hash):
+      continue
+    pending[goal.id] = (messages, input_hash)
+  goal_ids = {goal.id for goal, _ in goals}
+  # Uncompleted activities of goals that are no longer active
+  stale = [
+      goal_id for goal_id, row in existing_by_goal.items()
+      if goal_id not in goal_ids and not row.completed
+  ]
+  logger.info(
+      f"Generating {len(pending)} of {len(goals)} activities for {date}.")
+
+  job_manager = get_job_manager()
+  progress: dict[int, JobStatus] = {goal_id: "pending" for goal_id in pending}
+  job_manager.report_progress(progress)
+  semaphore = asyncio.Semaphore(CALENDAR_CONCURRENCY)
+  generated: dict[int, str] = {}
+
+  async def generate_one(
+      goal_id: int, messages: list["ChatCompletionMessageParam"]):
+    async with semaphore:
+      progress[goal_id] = "running"
+      job_manager.report_progress(progress)
+      try:
+        generated[goal_id] = await routed_completion(
+            model, messages, use_cache=request.use_cache)
+      except Exception as e:
+        logger.exception(f"Activity generation failed for goal {goal_id}: {e}")
+        progress[goal_id] = "error"
+        job_manager.report_progress(progress)
+
+  await asyncio.gather(
+      *(
+          generate_one(goal_id, messages)
+          for goal_id, (messages, _) in pending.items()))
+
+  rows = [
+      {
+          "description": description,
+          "date": date,
+          "goal_id": goal_id,
+          "input_hash": pending[goal_id][1],
+      } for goal_id, description in sorted(generated.items())
+  ]
+  await _save_activities(date, [*generated, *stale], rows)
+  progress.update({goal_id: "done" for goal_id in generated})
+  job_manager.report_progress(progress)
+
+  failed = len(pending) - len(generated)
+  if failed:
+    raise RuntimeError(
+        f"Activity generation failed for {failed} of {len(pending)} goals.")
+
+def _activity_messages(date: datetime_date, goal: Goal,
+                       strategy: str) -> list["ChatCompletionMessageParam"]:
+  system = render_prompt("system.j2")
+  context = render_prompt("common.j2", date=date.isoformat())
+  content = render_prompt("activities.j2", goal=goal, strategy=strategy)
+  return [
+      {
+          "role": "system",
+          "content": system
+      },
+      {
+          "role": "user",
+          "content": f"{context}\n\n{content}"
+      },
+  ]
+
+def _input_hash(
+    model: OpenAiApiModel, messages: list["ChatCompletionMessageParam"]) -> str:
+  payload = json.dumps(
+      [model.provider_id, model.name, messages], sort_keys=True)
+  return hashlib.sha256(payload.encode()).hexdigest()
+
+async def _save_activities(
+    date: datetime_date, replaced_goal_ids: list[int],
+    rows: list[dict]) -> None:
+  """Replaces the uncompleted activities of the given goals in one
+  transaction."""
+
+  async def write(db: AsyncSession):
+    if replaced_goal_ids:
+      await db.execute(
+          delete(Activity).where(
+              Activity.date == date, Activity.goal_id.in_(replaced_goal_ids),
+              Activity.completed.is_(False)))
+    if rows:
+      await db.execute(insert(Activity), rows)
+
+  await write_queue.submit(write)
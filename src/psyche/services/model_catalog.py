@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import logging
+import os
+from collections.abc import Iterable
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from psyche.database import ReadSessionLocal, write_queue
+from psyche.models.openai_api_models import (
+    OpenAiApiKey, OpenAiApiModel, OpenAiApiProvider)
+from psyche.schemas.job_schemas import JobStatus
+from psyche.schemas.openai_api_schemas import ModelRefreshRequest
+from psyche.job_manager import get_job_manager
+from psyche.openai_clients import get_openai_client
+
+logger = logging.getLogger(__name__)
+
+MODEL_LIST_TIMEOUT = 30.0
+# Seconds between scheduled refreshes of all catalogs; 0 disables them
+MODEL_REFRESH_INTERVAL = float(os.getenv("PSYCHE_MODEL_REFRESH_INTERVAL", "0"))
+
+def _fingerprint(names: Iterable[str]) -> str:
+  return hashlib.sha256("\n".join(sorted(names)).encode()).hexdigest()
+
+async def fetch_catalog(pid: int) -> set[str]:
+  client = await get_openai_client(pid)
+  async with asyncio.timeout(MODEL_LIST_TIMEOUT):
+    remote_model_list = await client.models.list()
+  return {model.id for model in remote_model_list.data}
+
+async def sync_catalogs(catalogs: dict[int, set[str]]) -> list[int]:
+  """Writes the model lists of the given providers and returns the ids of the
+  changed ones.
+
+  Catalogs matching the fingerprint stored with their provider are skipped;
+  the others are diffed against the stored models and written, along with
+  their fingerprints, in one transaction.
+  """
+  fingerprints = {pid: _fingerprint(names) for pid, names in catalogs.items()}
+  async with ReadSessionLocal() as db:
+    stored_fingerprints = await _fingerprints_of(db, catalogs)
+  if all(stored_fingerprints.get(pid) == fingerprints[pid] for pid in catalogs):
+    return []
+
+  changed: list[int] = []
+
+  async def write(db: AsyncSession):
+    # Checked again, as other processes may have synced in the meantime
+    stored_fingerprints = await _fingerprints_of(db, catalogs)
+    changed[:] = [
+        pid for pid in catalogs if pid in stored_fingerprints
+        and stored_fingerprints[pid] != fingerprints[pid]
+    ]
+    if not changed:
+      return
+    stored: dict[int, set[str]] = {pid: set() for pid in changed}
+    result = await db.execute(
+        select(OpenAiApiModel.provider_id, OpenAiApiModel.name).where(
+            OpenAiApiModel.provider_id.in_(changed)))
+    for pid, name in result:
+      stored[pid].add(name)
+
+    rows = [
+        dict(provider_id=pid, name=name) for pid in changed
+        for name in sorted(catalogs[pid] - stored[pid])
+    ]
+    dropped = [
+        and_(
+            OpenAiApiModel.provider_id == pid,
+            OpenAiApiModel.name.in_(stored[pid] - catalogs[pid]))
+        for pid in changed if stored[pid] - catalogs[pid]
+    ]
+    if rows:
+      await db.execute(insert(OpenAiApiModel), rows)
+    if dropped:
+      await db.execute(delete(OpenAiApiModel).where(or_(*dropped)))
+    await db.execute(
+        update(OpenAiApiProvider), [
+            dict(id=pid, catalog_fingerprint=fingerprints[pid])
+            for pid in changed
+        ])
+
+  await write_queue.submit(write)
+  return changed
+
+async def _fingerprints_of(db: AsyncSession,
+                           pids: Iterable[int]) -> dict[int, str | None]:
+  result = await db.execute(
+      select(OpenAiApiProvider.id, OpenAiApiProvider.catalog_fingerprint).where(
+          OpenAiApiProvider.id.in_(pids)))
+  return dict(result.tuples().all())
+
+async def refresh_model_catalogs(request: ModelRefreshRequest):
+  """Refreshes the model lists of all providers with an active key.
+
+  Catalogs are fetched concurrently, each with a timeout, and the changes are
+  written in one transaction. Per-provider status is reported as progress of
+  the current job.
+  """
+  stmt = select(OpenAiApiProvider.id).where(
+      OpenAiApiProvider.id.in_(
+          select(OpenAiApiKey.provider_id).where(
+              OpenAiApiKey.active))).order_by(OpenAiApiProvider.id)
+  if request.provider_ids is not None:
+    stmt = stmt.where(OpenAiApiProvider.id.in_(request.provider_ids))
+  async with ReadSessionLocal() as db:
+    pids = (await db.scalars(stmt)).all()
+
+  job_manager = get_job_manager()
+  progress: dict[int, JobStatus] = {pid: "running" for pid in pids}
+  job_manager.report_progress(progress)
+  catalogs: dict[int, set[str]] = {}
+
+  async def fetch(pid: int):
+    try:
+      catalogs[pid] = await fetch_catalog(pid)
+    except Exception as e:
+      logger.exception(f"Fetching the models of provider {pid} failed: {e}")
+      progress[pid] = "error"
+      job_manager.report_progress(progress)
+
+  await asyncio.gather(*(fetch(pid) for pid in pids))
+  changed = await sync_catalogs(catalogs)
+  progress |= {pid: "done" for pid in catalogs}
+  job_manager.report_progress(progress)
+  logger.info(
+      f"Refreshed the models of {len(catalogs)} providers, "
+      f"{len(changed)} changed.")
+
+  failed = len(pids) - len(catalogs)
+  if failed:
+    raise RuntimeError(
+        f"Model refresh failed for {failed} of {len(pids)} providers.")
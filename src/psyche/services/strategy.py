@@ -1,19 +1,26 @@
+import asyncio
 import logging
-import re
 from sqlalchemy import select, update
-from openai import APIConnectionError
-from psyche.database import SessionLocal
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from psyche.database import ReadSessionLocal, write_queue
 from psyche.models.goal_models import Goal, GoalStrategy
 from psyche.models.openai_api_models import OpenAiApiModel
-from psyche.schemas.goal_schemas import StrategyGenerationRequest
-from psyche.prompting import jinja_env
-from psyche.openai_clients import get_openai_client
+from psyche.schemas.goal_schemas import (
+    BulkStrategyGenerationRequest, StrategyGenerationRequest)
+from psyche.schemas.job_schemas import JobStatus
+from psyche.prompting import render_prompt
 from psyche.exceptions import ResourceNotFoundError
+from psyche.job_manager import get_job_manager
+from psyche.routing import routed_completion
 
 logger = logging.getLogger(__name__)
 
+BULK_CONCURRENCY = 8
+BULK_WRITE_BATCH_SIZE = 50
+
 async def generate_strategy(id: int, request: StrategyGenerationRequest):
-  async with SessionLocal() as db:
+  async with ReadSessionLocal() as db:
     goal = await db.scalar(select(Goal).where(Goal.id == id))
     if goal is None:
       raise ResourceNotFoundError()
@@ -21,27 +28,104 @@ async def generate_strategy(id: int, request: StrategyGenerationRequest):
         select(OpenAiApiModel).where(OpenAiApiModel.id == request.model_id))
     if model is None:
       raise ResourceNotFoundError()
-  template = jinja_env.get_template("strategy.j2")
-  prompt = template.render(goal=goal)
 
-  client = await get_openai_client(model.provider_id)
-  res = await client.chat.completions.create(
-      model=model.name,
-      messages=[{
+  strategy_text = await _generate_strategy_text(
+      goal, model, stream=request.stream, use_cache=request.use_cache)
+  await _save_strategies({goal.id: strategy_text})
+
+async def generate_strategies(request: BulkStrategyGenerationRequest):
+  """Regenerates the strategies of all goals matching the request.
+
+  LLM calls run with bounded concurrency and results are written in batches.
+  Per-goal status is reported as progress of the current job.
+  """
+  stmt = select(Goal).order_by(Goal.id)
+  if request.goal_ids is not None:
+    stmt = stmt.where(Goal.id.in_(request.goal_ids))
+  if request.active is not None:
+    stmt = stmt.where(Goal.active == request.active)
+  async with ReadSessionLocal() as db:
+    goals = (await db.scalars(stmt)).all()
+    model = await db.get(OpenAiApiModel, request.model_id)
+    if model is None:
+      raise ResourceNotFoundError()
+
+  job_manager = get_job_manager()
+  progress: dict[int, JobStatus] = {goal.id: "pending" for goal in goals}
+  job_manager.report_progress(progress)
+  semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+  write_lock = asyncio.Lock()
+  unsaved: dict[int, str] = {}
+
+  async def flush():
+    async with write_lock:
+      batch = dict(unsaved)
+      unsaved.clear()
+      if not batch:
+        return
+      status: JobStatus = "done"
+      try:
+        await _save_strategies(batch)
+      except Exception as e:
+        # The other goals keep going; the job fails once they are done
+        logger.exception(f"Saving {len(batch)} strategies failed: {e}")
+        status = "error"
+      progress.update({goal_id: status for goal_id in batch})
+      job_manager.report_progress(progress)
+
+  async def generate_one(goal: Goal):
+    async with semaphore:
+      progress[goal.id] = "running"
+      job_manager.report_progress(progress)
+      try:
+        unsaved[goal.id] = await _generate_strategy_text(
+            goal, model, use_cache=request.use_cache)
+      except Exception as e:
+        logger.exception(f"Strategy generation failed for goal {goal.id}: {e}")
+        progress[goal.id] = "error"
+        job_manager.report_progress(progress)
+        return
+    if len(unsaved) >= BULK_WRITE_BATCH_SIZE:
+      await flush()
+
+  await asyncio.gather(*(generate_one(goal) for goal in goals))
+  await flush()
+
+  failed = sum(1 for status in progress.values() if status == "error")
+  if failed:
+    raise RuntimeError(
+        f"Strategy generation failed for {failed} of {len(goals)} goals.")
+
+async def _generate_strategy_text(
+    goal: Goal,
+    model: OpenAiApiModel,
+    stream: bool = False,
+    use_cache: bool = True) -> str:
+  prompt = render_prompt("strategy.j2", goal=goal)
+  return await routed_completion(
+      model, [{
           "role": "user",
           "content": prompt
       }],
-  )
-  content = res.choices[0].message.content or ""
-
-  strategy_text = re.sub(
-      r"<think>.*?</think>", "", content, flags=re.DOTALL).strip()
-  async with SessionLocal() as db:
-    existing_strategy = await db.scalar(
-        select(GoalStrategy).where(GoalStrategy.goal_id == goal.id))
-    if existing_strategy:
-      existing_strategy.strategy = strategy_text
-    else:
-      db.add(GoalStrategy(goal_id=goal.id, strategy=strategy_text))
-    await db.execute(update(Goal).where(Goal.id == goal.id).values(active=True))
-    await db.commit()
+      stream=stream,
+      use_cache=use_cache)
+
+async def _save_strategies(strategies: dict[int, str]) -> None:
+  """Upserts goal strategies and activates their goals in one transaction."""
+  stmt = insert(GoalStrategy).values(
+      [
+          {
+              "goal_id": goal_id,
+              "strategy": strategy
+          } for goal_id, strategy in strategies.items()
+      ])
+  stmt = stmt.on_conflict_do_update(
+      index_elements=[GoalStrategy.goal_id],
+      set_={"strategy": stmt.excluded.strategy})
+
+  async def write(db: AsyncSession):
+    await db.execute(stmt)
+    await db.execute(
+        update(Goal).where(Goal.id.in_(strategies)).values(active=True))
+
+  await write_queue.submit(write)
@@ -0,0 +1,111 @@
+import functools
+import hashlib
+import os
+import uuid
+from collections import defaultdict
+from collections.abc import Iterable
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState, Session
+from psyche.models.base import Base
+
+CacheHeaders = dict[str, str]
+# Foreign key actions that change rows of the referencing table
+ON_DELETE_ACTIONS = ("CASCADE", "SET NULL", "SET DEFAULT")
+
+class TableVersions:
+  """In-process version counters of database tables.
+
+  Every committed ORM write bumps the versions of the tables it touched, and
+  of the tables their deletes may cascade to. Read endpoints derive ETags from
+  them, so unchanged data can be answered with 304 without querying the
+  database.
+  """
+
+  def __init__(self) -> None:
+    # Versions restart with the process; the token keeps old ETags invalid
+    self._token = uuid.uuid4().hex[:8]
+    self._versions: defaultdict[str, int] = defaultdict(int)
+    # Counters only see writes of this process, which excludes deployments
+    # with separate API and executor processes.
+    self.enabled = os.getenv("PSYCHE_JOB_ROLE", "all") == "all"
+
+  def bump(self, tables: Iterable[str]) -> None:
+    for table in _with_cascades(tables):
+      self._versions[table] += 1
+
+  def etag(self, tables: Iterable[str], key: str) -> str:
+    versions = ",".join(f"{table}:{self._versions[table]}" for table in tables)
+    digest = hashlib.sha1(f"{key}|{versions}".encode()).hexdigest()[:16]
+    return f'W/"{self._token}-{digest}"'
+
+table_versions = TableVersions()
+
+def _with_cascades(tables: Iterable[str]) -> set[str]:
+  """Adds the tables whose rows the database changes along with `tables`
+  through `ON DELETE` foreign key actions, transitively."""
+  dependents = _cascade_dependents(len(Base.metadata.tables))
+  result = set(tables)
+  pending = list(result)
+  while pending:
+    for dependent in dependents.get(pending.pop(), ()):
+      if dependent not in result:
+        result.add(dependent)
+        pending.append(dependent)
+  return result
+
+@functools.cache
+def _cascade_dependents(table_count: int) -> dict[str, set[str]]:
+  # Keyed by the table count, so that models imported later are included
+  dependents: defaultdict[str, set[str]] = defaultdict(set)
+  for table in Base.metadata.tables.values():
+    for fk in table.foreign_keys:
+      if fk.ondelete and fk.ondelete.upper() in ON_DELETE_ACTIONS:
+        dependents[fk.column.table.name].add(table.name)
+  return dependents
+
+def _changed_tables(session: Session) -> set[str]:
+  return session.info.setdefault("changed_tables", set())
+
+@event.listens_for(Session, "after_flush")
+def _record_flush(session: Session, flush_context) -> None:
+  for obj in (*session.new, *session.dirty, *session.deleted):
+    table = getattr(obj, "__tablename__", None)
+    if table is not None:
+      _changed_tables(session).add(table)
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_bulk_write(state: ORMExecuteState) -> None:
+  if state.is_select or state.bind_mapper is None:
+    return
+  _changed_tables(state.session).add(state.bind_mapper.local_table.name)
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session: Session) -> None:
+  table_versions.bump(session.info.pop("changed_tables", ()))
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+  session.info.pop("changed_tables", None)
+
+def conditional_get(*tables: str):
+  """Dependency answering `If-None-Match` requests for data of `tables`.
+
+  Raises a 304 when the client's ETag is current. Otherwise, returns the
+  caching headers, which are also set on the default response; routes that
+  return a response object themselves have to add them.
+  """
+
+  async def check(request: Request, response: Response) -> CacheHeaders:
+    if not table_versions.enabled:
+      return {}
+    etag = table_versions.etag(
+        tables, f"{request.url.path}?{request.url.query}")
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+      raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return headers
+
+  return Depends(check)
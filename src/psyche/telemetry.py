@@ -0,0 +1,186 @@
+import bisect
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+LabelSet = tuple[tuple[str, str], ...]
+
+LATENCY_BUCKETS = (
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+def _labels(labels: dict[str, Any]) -> LabelSet:
+  return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(labels: LabelSet) -> str:
+  if not labels:
+    return ""
+  escaped = (
+      value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+      for _, value in labels)
+  pairs = (f'{name}="{value}"' for (name, _), value in zip(labels, escaped))
+  return "{" + ",".join(pairs) + "}"
+
+class Counter:
+
+  def __init__(self, name: str, help: str) -> None:
+    self.name = name
+    self.help = help
+    self._values: dict[LabelSet, float] = {}
+
+  def inc(self, amount: float = 1.0, **labels: Any) -> None:
+    key = _labels(labels)
+    self._values[key] = self._values.get(key, 0.0) + amount
+
+  def render(self) -> Iterator[str]:
+    yield f"# HELP {self.name} {self.help}"
+    yield f"# TYPE {self.name} counter"
+    for labels, value in self._values.items():
+      yield f"{self.name}{_format_labels(labels)} {value}"
+
+class Histogram:
+  """Fixed-bucket histogram; a few counters per label set."""
+
+  def __init__(
+      self,
+      name: str,
+      help: str,
+      buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+    self.name = name
+    self.help = help
+    self.buckets = buckets
+    # Label set -> (per-bucket counts incl. +Inf, sum)
+    self._values: dict[LabelSet, tuple[list[int], list[float]]] = {}
+
+  def observe(self, value: float, **labels: Any) -> None:
+    key = _labels(labels)
+    counts, total = self._values.setdefault(
+        key, ([0] * (len(self.buckets) + 1), [0.0]))
+    counts[bisect.bisect_left(self.buckets, value)] += 1
+    total[0] += value
+
+  def render(self) -> Iterator[str]:
+    yield f"# HELP {self.name} {self.help}"
+    yield f"# TYPE {self.name} histogram"
+    for labels, (counts, total) in self._values.items():
+      cumulative = 0
+      for bound, count in zip((*self.buckets, "+Inf"), counts):
+        cumulative += count
+        bucket_labels = _format_labels((*labels, ("le", str(bound))))
+        yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+      yield f"{self.name}_sum{_format_labels(labels)} {total[0]}"
+      yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+class MetricsRegistry:
+
+  def __init__(self) -> None:
+    self._metrics: list[Counter | Histogram] = []
+
+  def counter(self, name: str, help: str) -> Counter:
+    metric = Counter(name, help)
+    self._metrics.append(metric)
+    return metric
+
+  def histogram(self, name: str, help: str) -> Histogram:
+    metric = Histogram(name, help)
+    self._metrics.append(metric)
+    return metric
+
+  def render(self) -> str:
+    """Returns all metrics in the Prometheus text exposition format."""
+    return "\n".join(
+        line for metric in self._metrics for line in metric.render()) + "\n"
+
+registry = MetricsRegistry()
+
+llm_requests = registry.counter(
+    "psyche_llm_requests_total", "LLM requests sent to providers, by outcome.")
+llm_cache_hits = registry.counter(
+    "psyche_llm_cache_hits_total", "LLM requests answered from the cache.")
+llm_tokens = registry.counter(
+    "psyche_llm_tokens_total",
+    "Tokens reported by providers, by kind (prompt, completion, cached).")
+llm_wait_seconds = registry.histogram(
+    "psyche_llm_limiter_wait_seconds",
+    "Time LLM requests waited for the provider's concurrency and rate limits.")
+llm_duration_seconds = registry.histogram(
+    "psyche_llm_request_duration_seconds", "Duration of LLM requests.")
+llm_ttft_seconds = registry.histogram(
+    "psyche_llm_time_to_first_token_seconds",
+    "Time to the first streamed token of LLM requests.")
+llm_hedges = registry.counter(
+    "psyche_llm_hedged_requests_total",
+    "Hedged LLM requests, by whether the primary or the hedge answered first.")
+jobs = registry.counter("psyche_jobs_total", "Finished jobs, by status.")
+job_queue_wait_seconds = registry.histogram(
+    "psyche_job_queue_wait_seconds",
+    "Time from job submission to the start of its execution.")
+job_duration_seconds = registry.histogram(
+    "psyche_job_run_duration_seconds", "Execution time of jobs.")
+
+@dataclass(slots=True)
+class LlmCall:
+  provider_id: int
+  model: str
+  started_at: float = field(default_factory=time.time)
+  wait: float = 0.0
+  duration: float = 0.0
+  ttft: float | None = None
+  prompt_tokens: int | None = None
+  completion_tokens: int | None = None
+  cached_tokens: int | None = None
+  outcome: str = "ok"
+  _clock: float = field(default_factory=time.perf_counter, repr=False)
+
+  def sent(self) -> None:
+    """Marks the end of the wait for the provider's limits."""
+    self.wait = time.perf_counter() - self._clock
+
+  def first_token(self) -> None:
+    if self.ttft is None:
+      self.ttft = time.perf_counter() - self._clock - self.wait
+
+  def set_usage(self, usage: Any) -> None:
+    if usage is None:
+      return
+    self.prompt_tokens = usage.prompt_tokens
+    self.completion_tokens = usage.completion_tokens
+    details = getattr(usage, "prompt_tokens_details", None)
+    self.cached_tokens = getattr(details, "cached_tokens", None)
+
+# Rolling window of the latest provider calls
+recent_llm_calls: deque[LlmCall] = deque(maxlen=1000)
+
+def record_llm_call(call: LlmCall) -> None:
+  labels = {"provider": call.provider_id, "model": call.model}
+  recent_llm_calls.append(call)
+  llm_requests.inc(outcome=call.outcome, **labels)
+  llm_wait_seconds.observe(call.wait, **labels)
+  llm_duration_seconds.observe(call.duration, **labels)
+  if call.ttft is not None:
+    llm_ttft_seconds.observe(call.ttft, **labels)
+  for kind in ("prompt", "completion", "cached"):
+    tokens = getattr(call, f"{kind}_tokens")
+    if tokens:
+      llm_tokens.inc(tokens, kind=kind, **labels)
+
+@contextmanager
+def track_llm_call(provider_id: int, model: str) -> Iterator[LlmCall]:
+  """Records the provider call made in the block, failed or not."""
+  call = LlmCall(provider_id=provider_id, model=model)
+  try:
+    yield call
+  except BaseException as e:
+    call.outcome = type(e).__name__
+    raise
+  finally:
+    call.duration = time.perf_counter() - call._clock - call.wait
+    record_llm_call(call)
+
+def record_job(
+    handler: str, status: str, queue_wait: float, duration: float) -> None:
+  job_queue_wait_seconds.observe(queue_wait, handler=handler)
+  job_duration_seconds.observe(duration, handler=handler)
+  jobs.inc(handler=handler, status=status)
@@ -0,0 +1,55 @@
+"""ETags of tables whose rows are removed by ON DELETE CASCADE."""
+import asyncio
+import os
+import tempfile
+
+os.environ.setdefault(
+    "SQLITE_DB_FILENAME", os.path.join(tempfile.mkdtemp(), "test.sqlite"))
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import create_engine
+from psyche.database import SQLITE_DB_FILENAME, SessionLocal
+from psyche.fastapi_app import app
+from psyche.models import Base
+from psyche.models.goal_models import GoalStrategy
+
+Base.metadata.create_all(create_engine(f"sqlite:///{SQLITE_DB_FILENAME}"))
+
+async def _etag_after_parent_delete(
+    client: AsyncClient, parent_url: str, child_url: str) -> int:
+  first = await client.get(child_url)
+  assert first.status_code == 200
+  assert (await client.delete(parent_url)).status_code in (200, 204)
+  again = await client.get(
+      child_url, headers={"If-None-Match": first.headers["ETag"]})
+  return again.status_code
+
+def test_cascaded_deletes_invalidate_etags():
+
+  async def run():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as c:
+      provider = (
+          await c.post(
+              "/openai-api-providers",
+              json=dict(name="p", base_url="http://localhost"))).json()
+      assert await _etag_after_parent_delete(
+          c, f"/openai-api-providers/{provider['id']}",
+          "/openai-api-models") == 200
+
+      goal = (
+          await c.post(
+              "/goals",
+              json=dict(
+                  title="t",
+                  description="d",
+                  initial_progress="p",
+                  strategy_guidelines="g"))).json()
+      async with SessionLocal() as db:
+        db.add(GoalStrategy(goal_id=goal["id"], strategy="s"))
+        await db.commit()
+      # The strategy went with the goal
+      assert await _etag_after_parent_delete(
+          c, f"/goals/{goal['id']}", f"/goals/{goal['id']}/strategy") == 404
+
+  asyncio.run(run())